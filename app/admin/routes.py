@@ -0,0 +1,19 @@
+from fastapi import APIRouter, Depends, Query
+from app.auth.auth_dependencies import require_admin
+from app.slow_queries import slow_query_log
+
+router = APIRouter(dependencies=[Depends(require_admin)])
+
+
+@router.get("/slow-queries", summary="Latest statements slower than SLOW_QUERY_MS, newest first")
+async def get_slow_queries(limit: int = Query(None, ge=1)):
+    return {
+        "threshold_ms": slow_query_log.threshold_ms,
+        "stats": dict(slow_query_log.stats),
+        "entries": slow_query_log.snapshot(limit),
+    }
+
+
+@router.delete("/slow-queries", status_code=204, summary="Forget the recorded slow statements")
+async def clear_slow_queries():
+    slow_query_log.clear()
@@ -0,0 +1,118 @@
+import time
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.analytics.sketch import QuantileSketch
+from app.config import GLOBAL_SKETCH_TTL_SECONDS
+from app.models import GameSession, PlayerSketch
+
+REBUILD_BATCH_SIZE = 1000
+
+
+async def player_sketch(db: AsyncSession, user_id: int, for_update: bool = False):
+    query = select(PlayerSketch).where(PlayerSketch.user_id == user_id)
+    if for_update:
+        query = query.with_for_update()
+    row = (await db.execute(query)).scalars().first()
+    return row, (QuantileSketch.from_json(row.data) if row is not None else QuantileSketch())
+
+
+async def record_deviation(db: AsyncSession, user_id: int, deviation: float, played_at):
+    """Add one stopped game to the player's sketch.
+
+    Runs inside the caller's transaction, like record_game_result.
+    """
+    row, sketch = await player_sketch(db, user_id, for_update=True)
+    sketch.add(deviation)
+    if row is None:
+        db.add(PlayerSketch(user_id=user_id, data=sketch.to_json(), updated_at=played_at))
+    else:
+        row.data = sketch.to_json()
+        row.updated_at = played_at
+    return sketch
+
+
+async def rebuild_player_sketches(db: AsyncSession):
+    """Recompute every PlayerSketch row from game_sessions."""
+    await db.execute(delete(PlayerSketch))
+    result = await db.stream(
+        select(GameSession.user_id, GameSession.deviation, GameSession.stop_time)
+        .where(GameSession.status == "stopped")
+        .order_by(GameSession.user_id)
+        .execution_options(yield_per=REBUILD_BATCH_SIZE)
+    )
+    players = 0
+    user_id = sketch = last_played = None
+    async for row in result:
+        if row.user_id != user_id:
+            if sketch is not None:
+                db.add(PlayerSketch(user_id=user_id, data=sketch.to_json(), updated_at=last_played))
+                players += 1
+            user_id, sketch, last_played = row.user_id, QuantileSketch(), None
+        sketch.add(row.deviation or 0.0)
+        if row.stop_time is not None and (last_played is None or row.stop_time > last_played):
+            last_played = row.stop_time
+    if sketch is not None:
+        db.add(PlayerSketch(user_id=user_id, data=sketch.to_json(), updated_at=last_played))
+        players += 1
+    await db.commit()
+    global_sketch.invalidate()
+    return players
+
+
+class GlobalSketch:
+    """All player sketches merged, rebuilt at most every ``ttl`` seconds.
+
+    Games stopped by this process are added straight away; the ones other
+    workers record show up on the next rebuild.
+    """
+
+    def __init__(self, ttl: float = GLOBAL_SKETCH_TTL_SECONDS, clock=time.monotonic):
+        self.ttl = ttl
+        self.clock = clock
+        self._sketch = None
+        self._expires_at = 0.0
+
+    def add(self, deviation: float):
+        if self._sketch is not None:
+            self._sketch.add(deviation)
+
+    def invalidate(self):
+        self._sketch = None
+
+    async def get(self, db: AsyncSession) -> QuantileSketch:
+        if self._sketch is not None and self.clock() < self._expires_at:
+            return self._sketch
+        merged = QuantileSketch()
+        result = await db.stream(
+            select(PlayerSketch.data).execution_options(yield_per=REBUILD_BATCH_SIZE)
+        )
+        async for data in result.scalars():
+            merged.merge(QuantileSketch.from_json(data))
+        self._sketch = merged
+        self._expires_at = self.clock() + self.ttl
+        return merged
+
+
+global_sketch = GlobalSketch()
+
+
+def describe(sketch: QuantileSketch, bins: int):
+    return {
+        "games": sketch.count,
+        "average_deviation_ms": round(sketch.total / sketch.count, 2) if sketch.count else 0,
+        "p50_ms": _round(sketch.quantile(0.5)),
+        "p90_ms": _round(sketch.quantile(0.9)),
+        "p99_ms": _round(sketch.quantile(0.99)),
+        "histogram": [
+            {
+                "lower_ms": round(bucket["lower"], 2),
+                "upper_ms": round(bucket["upper"], 2),
+                "count": bucket["count"]
+            }
+            for bucket in sketch.histogram(bins)
+        ]
+    }
+
+
+def _round(value):
+    return round(value, 2) if value is not None else None
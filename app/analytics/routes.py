@@ -1,49 +1,135 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.future import select
-from sqlalchemy import func
-from app.database import get_db
-from app.models import User, GameSession
-
-router = APIRouter()
-
-@router.get("/user/{user_id}", summary="User game statistics")
-async def get_user_stats(user_id: int, db: AsyncSession = Depends(get_db)):
-    user_result = await db.execute(select(User).where(User.id == user_id))
-    user = user_result.scalars().first() 
-
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-
-    games_result = await db.execute(
-        select(GameSession).where(GameSession.user_id == user_id).order_by(GameSession.created_at.desc())
-    )
-    games = games_result.scalars().all()
-
-    stats_result = await db.execute(
-        select(
-            func.count(GameSession.id),
-            func.avg(GameSession.deviation),
-            func.min(GameSession.deviation),
-            func.max(GameSession.deviation)
-        ).where(GameSession.user_id == user_id, GameSession.status == "stopped")
-    )
-    total, avg_dev, min_dev, max_dev = stats_result.one()
-
-    return {
-        "username": user.username,
-        "total_games": total,
-        "average_deviation_ms": round(avg_dev or 0, 2),
-        "best_deviation_ms": round(min_dev or 0, 2),
-        "worst_deviation_ms": round(max_dev or 0, 2),
-        "history": [
-            {
-                "session_id": g.id,
-                "started_at": g.start_time,
-                "duration_ms": round(g.duration or 0, 2),
-                "deviation_ms": round(g.deviation or 0, 2),
-                "status": g.status
-            }
-            for g in games
-        ]
-    }
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from sqlalchemy import func, tuple_
+from datetime import datetime
+from typing import Annotated, Optional
+from app.database import get_db, SessionLocal
+from app.models import User, GameSession
+from app.analytics.distribution import player_sketch, global_sketch, describe
+import base64
+import json
+
+router = APIRouter()
+
+HISTORY_PAGE_SIZE = 50
+MAX_HISTORY_PAGE_SIZE = 500
+STREAM_BATCH_SIZE = 1000
+HISTOGRAM_BINS = 10
+MAX_HISTOGRAM_BINS = 100
+
+
+def encode_cursor(game):
+    raw = f"{game.created_at.isoformat()}|{game.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: str):
+    try:
+        created_at, game_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(created_at), int(game_id)
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def history_query(user_id: int, cursor: Optional[str] = None):
+    # Newest first, walking the (user_id, created_at) index; id breaks ties
+    query = (
+        select(GameSession)
+        .where(GameSession.user_id == user_id)
+        .order_by(GameSession.created_at.desc(), GameSession.id.desc())
+    )
+    if cursor:
+        created_at, game_id = decode_cursor(cursor)
+        query = query.where(tuple_(GameSession.created_at, GameSession.id) < tuple_(created_at, game_id))
+    return query
+
+
+def history_item(g):
+    return {
+        "session_id": g.id,
+        "started_at": g.start_time,
+        "duration_ms": round(g.duration or 0, 2),
+        "deviation_ms": round(g.deviation or 0, 2),
+        "status": g.status
+    }
+
+
+@router.get("/user/{user_id}", summary="User game statistics")
+async def get_user_stats(
+    user_id: int,
+    db: AsyncSession = Depends(get_db),
+    limit: Annotated[int, Query(ge=1, le=MAX_HISTORY_PAGE_SIZE)] = HISTORY_PAGE_SIZE,
+    cursor: Annotated[Optional[str], Query(description="next_cursor from the previous page")] = None
+):
+    user_result = await db.execute(select(User).where(User.id == user_id))
+    user = user_result.scalars().first() 
+
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    games_result = await db.execute(history_query(user_id, cursor).limit(limit + 1))
+    games = games_result.scalars().all()
+    next_cursor = encode_cursor(games[limit - 1]) if len(games) > limit else None
+    games = games[:limit]
+
+    stats_result = await db.execute(
+        select(
+            func.count(),
+            func.avg(GameSession.deviation),
+            func.min(GameSession.deviation),
+            func.max(GameSession.deviation)
+        ).where(GameSession.user_id == user_id, GameSession.status == "stopped")
+    )
+    total, avg_dev, min_dev, max_dev = stats_result.one()
+
+    return {
+        "username": user.username,
+        "total_games": total,
+        "average_deviation_ms": round(avg_dev or 0, 2),
+        "best_deviation_ms": round(min_dev or 0, 2),
+        "worst_deviation_ms": round(max_dev or 0, 2),
+        "history": [history_item(g) for g in games],
+        "next_cursor": next_cursor
+    }
+
+
+@router.get("/user/{user_id}/history.ndjson", summary="Full game history as NDJSON")
+async def stream_user_history(user_id: int, db: AsyncSession = Depends(get_db)):
+    user_result = await db.execute(select(User.id).where(User.id == user_id))
+    if user_result.first() is None:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    async def rows():
+        # The request's session is closed once the response starts, so stream on our own
+        async with SessionLocal() as session:
+            result = await session.stream(
+                history_query(user_id).execution_options(yield_per=STREAM_BATCH_SIZE)
+            )
+            async for game in result.scalars():
+                yield json.dumps(history_item(game), default=datetime.isoformat) + "\n"
+
+    return StreamingResponse(rows(), media_type="application/x-ndjson")
+
+
+@router.get("/user/{user_id}/distribution", summary="Deviation percentiles and histogram for a user")
+async def get_user_distribution(
+    user_id: int,
+    db: AsyncSession = Depends(get_db),
+    bins: Annotated[int, Query(ge=1, le=MAX_HISTOGRAM_BINS)] = HISTOGRAM_BINS
+):
+    user_result = await db.execute(select(User.id).where(User.id == user_id))
+    if user_result.first() is None:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    _, sketch = await player_sketch(db, user_id)
+    return {"user_id": user_id, **describe(sketch, bins)}
+
+
+@router.get("/distribution", summary="Deviation percentiles and histogram across all players")
+async def get_global_distribution(
+    db: AsyncSession = Depends(get_db),
+    bins: Annotated[int, Query(ge=1, le=MAX_HISTOGRAM_BINS)] = HISTOGRAM_BINS
+):
+    return describe(await global_sketch.get(db), bins)
@@ -0,0 +1,122 @@
+import json
+import math
+
+RELATIVE_ACCURACY = 0.01
+MAX_BINS = 2048
+# Values below this (in ms) are counted as zero
+MIN_VALUE = 1e-3
+
+
+class QuantileSketch:
+    """Mergeable quantile sketch over non-negative values (DDSketch style).
+
+    Values fall into logarithmic buckets, so every quantile is within
+    RELATIVE_ACCURACY of the true value however many values were added,
+    and size depends on the value range, not the count. Two sketches
+    merge by adding their bucket counts.
+    """
+
+    __slots__ = ("count", "zero", "total", "min", "max", "bins")
+
+    gamma = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+    _log_gamma = math.log(gamma)
+
+    def __init__(self):
+        self.count = 0
+        self.zero = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+        self.bins = {}
+
+    def __len__(self):
+        return self.count
+
+    def add(self, value: float, count: int = 1):
+        value = max(value, 0.0)
+        if value < MIN_VALUE:
+            self.zero += count
+        else:
+            index = math.ceil(math.log(value) / self._log_gamma)
+            self.bins[index] = self.bins.get(index, 0) + count
+            self._collapse()
+        self.count += count
+        self.total += value * count
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def merge(self, other: "QuantileSketch"):
+        if not other.count:
+            return
+        for index, count in other.bins.items():
+            self.bins[index] = self.bins.get(index, 0) + count
+        self._collapse()
+        self.count += other.count
+        self.zero += other.zero
+        self.total += other.total
+        self.min = other.min if self.min is None else min(self.min, other.min)
+        self.max = other.max if self.max is None else max(self.max, other.max)
+
+    def quantile(self, q: float):
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = self.zero
+        if seen > rank:
+            return self.min
+        for index in sorted(self.bins):
+            seen += self.bins[index]
+            if seen > rank:
+                return min(max(self._value(index), self.min), self.max)
+        return self.max
+
+    def histogram(self, bins: int = 10):
+        """Counts over ``bins`` equal-width buckets between min and max."""
+        if not self.count:
+            return []
+        width = (self.max - self.min) / bins or 1.0
+        counts = [0] * bins
+        counts[0] += self.zero
+        for index, count in self.bins.items():
+            value = min(max(self._value(index), self.min), self.max)
+            counts[min(int((value - self.min) / width), bins - 1)] += count
+        return [
+            {"lower": self.min + i * width, "upper": self.min + (i + 1) * width, "count": count}
+            for i, count in enumerate(counts)
+        ]
+
+    def to_json(self) -> str:
+        return json.dumps({
+            "n": self.count,
+            "z": self.zero,
+            "s": self.total,
+            "min": self.min,
+            "max": self.max,
+            "b": sorted(self.bins.items())
+        }, separators=(",", ":"))
+
+    @classmethod
+    def from_json(cls, data: str) -> "QuantileSketch":
+        raw = json.loads(data)
+        sketch = cls()
+        sketch.count = raw["n"]
+        sketch.zero = raw["z"]
+        sketch.total = raw["s"]
+        sketch.min = raw["min"]
+        sketch.max = raw["max"]
+        sketch.bins = {index: count for index, count in raw["b"]}
+        return sketch
+
+    def _value(self, index: int) -> float:
+        # Midpoint of (gamma^(i-1), gamma^i] with relative error RELATIVE_ACCURACY
+        return 2 * self.gamma ** index / (self.gamma + 1)
+
+    def _collapse(self):
+        # Fold the lowest buckets together so the sketch stays bounded;
+        # only the smallest quantiles lose accuracy
+        if len(self.bins) <= MAX_BINS:
+            return
+        indexes = sorted(self.bins)
+        keep = indexes[-MAX_BINS]
+        folded = sum(self.bins.pop(index) for index in indexes[:-MAX_BINS])
+        self.bins[keep] += folded
@@ -1,35 +1,76 @@
-from fastapi import Depends, HTTPException, status
-from fastapi.security import OAuth2PasswordBearer
-from jose import JWTError, jwt
-from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.future import select
-from app.database import get_db
-from app import models
-from dotenv import load_dotenv
-import os
-
-load_dotenv()
-SECRET_KEY = os.getenv("SECRET_KEY")
-ALGORITHM = os.getenv("ALGORITHM")
-
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
-
-async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)):
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id: str = payload.get("sub")
-        if user_id is None:
-            raise credentials_exception
-    except JWTError:
-        raise credentials_exception
-
-    result = await db.execute(select(models.User).where(models.User.id == int(user_id)))
-    user = result.scalars().first()
-    if user is None:
-        raise credentials_exception
-    return user
+from fastapi import Depends, Header, HTTPException, status
+from fastapi.security import OAuth2PasswordBearer
+from jose import JWTError, jwt
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from app.database import get_db
+from app import models
+from app.auth.cache import TTLCache
+from app.config import SECRET_KEY, ALGORITHM, USER_CACHE_SIZE, USER_CACHE_TTL_SECONDS
+from app.config import AUTH_TRUST_TOKEN_CLAIMS as TRUST_TOKEN_CLAIMS
+from app.config import ADMIN_TOKEN
+import hmac
+import time
+
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
+
+# token -> authenticated principal, tagged with the user id for invalidation
+user_cache = TTLCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL_SECONDS)
+
+
+class TokenPrincipal:
+    """The authenticated user as described by the signed token claims."""
+
+    __slots__ = ("id", "username")
+
+    def __init__(self, id: int, username: str):
+        self.id = id
+        self.username = username
+
+
+def invalidate_user(user_id: int):
+    """Forget every cached principal for a user, e.g. after it changes or is removed."""
+    user_cache.invalidate_owner(user_id)
+
+
+def _seconds_left(payload: dict):
+    exp = payload.get("exp")
+    if exp is None:
+        return None
+    return exp - time.time()
+
+
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)):
+    cached = user_cache.get(token)
+    if cached is not None:
+        return cached
+
+    credentials_exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Could not validate credentials",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        user_id: str = payload.get("sub")
+        if user_id is None:
+            raise credentials_exception
+    except JWTError:
+        raise credentials_exception
+
+    if TRUST_TOKEN_CLAIMS and payload.get("username"):
+        user = TokenPrincipal(int(user_id), payload["username"])
+    else:
+        result = await db.execute(select(models.User).where(models.User.id == int(user_id)))
+        user = result.scalars().first()
+        if user is None:
+            raise credentials_exception
+
+    user_cache.set(token, user, owner=user.id, ttl=_seconds_left(payload))
+    return user
+
+
+def require_admin(x_admin_token: str = Header(None)):
+    """Operator endpoints take the shared ADMIN_TOKEN, not a player's token."""
+    if not ADMIN_TOKEN or not x_admin_token or not hmac.compare_digest(x_admin_token, ADMIN_TOKEN):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin token required")
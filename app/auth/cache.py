@@ -0,0 +1,71 @@
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """Bounded LRU cache whose entries also expire after a deadline.
+
+    Entries can be tagged with an owner (e.g. a user id) so every entry
+    belonging to it can be dropped at once.
+    """
+
+    def __init__(self, maxsize: int, ttl: float, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._owners = {}
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key):
+        item = self._data.get(key)
+        if item is None:
+            self.misses += 1
+            return None
+        value, owner, expires_at = item
+        if expires_at <= self.clock():
+            self._remove(key)
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key, value, owner=None, ttl: float = None):
+        if self.maxsize <= 0:
+            return
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        if ttl <= 0:
+            return
+        if key in self._data:
+            self._remove(key)
+        self._data[key] = (value, owner, self.clock() + ttl)
+        if owner is not None:
+            self._owners.setdefault(owner, set()).add(key)
+        while len(self._data) > self.maxsize:
+            self._remove(next(iter(self._data)))
+
+    def invalidate(self, key):
+        self._remove(key)
+
+    def invalidate_owner(self, owner):
+        for key in self._owners.pop(owner, ()):
+            self._data.pop(key, None)
+
+    def clear(self):
+        self._data.clear()
+        self._owners.clear()
+
+    def _remove(self, key):
+        item = self._data.pop(key, None)
+        if item is None or item[1] is None:
+            return
+        keys = self._owners.get(item[1])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._owners[item[1]]
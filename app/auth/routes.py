@@ -1,87 +1,66 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Body
-from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.future import select
-from passlib.context import CryptContext
-from jose import jwt, JWTError
-from datetime import datetime, timedelta
-from app.database import get_db
-from app import models
-from app.auth import schemas
-from dotenv import load_dotenv
-import os
-from datetime import UTC
-from typing import Annotated
-
-load_dotenv()
-
-router = APIRouter()
-
-SECRET_KEY = os.getenv("SECRET_KEY")
-ALGORITHM = os.getenv("ALGORITHM")
-ACCESS_TOKEN_EXPIRE_MINUTES = 60
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
-def hash_password(password: str):
-    return pwd_context.hash(password)
-
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
-
-def create_access_token(data: dict, expires_delta: timedelta = None):
-    to_encode = data.copy()
-    if expires_delta:
-        expire = datetime.utcnow() + expires_delta
-    else:
-        expire = datetime.utcnow() + timedelta(minutes=15)
-    to_encode.update({"exp": expire})
-    return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
-
-@router.post("/register", response_model=schemas.UserOut)
-async def register(user: Annotated[
-        schemas.UserCreate,
-        Body(
-            examples=[
-                {
-                    "username": "Foo",
-                    "email": "a@a.co",
-                    "password": "supersecretpassword"
-                }
-            ],
-        ),
-    ], db: AsyncSession = Depends(get_db)):
-    result = await db.execute(select(models.User).where(models.User.email == user.email))
-    if result.scalars().first():
-        raise HTTPException(status_code=400, detail="Email already registered")
-
-    db_user = models.User(
-        username=user.username,
-        email=user.email,
-        hashed_password=hash_password(user.password)
-    )
-    db.add(db_user)
-    await db.commit()
-    await db.refresh(db_user)
-    return db_user
-
-@router.post("/login", response_model=schemas.Token)
-async def login(user: Annotated[
-        schemas.UserLogin,
-        Body(
-            examples=[
-                {
-                    "email": "a@a.co",
-                    "password": "supersecretpassword"
-                }
-            ],
-        ),
-    ], db: AsyncSession = Depends(get_db)):
-    result = await db.execute(select(models.User).where(models.User.email == user.email))
-    db_user = result.scalars().first()
-    if not db_user or not verify_password(user.password, db_user.hashed_password):
-        raise HTTPException(status_code=401, detail="Invalid credentials")
-
-    access_token = create_access_token(
-        data={"sub": str(db_user.id)},
-        expires_delta=timedelta(minutes=60)
-    )
-    return {"access_token": access_token, "token_type": "bearer"}
+from fastapi import APIRouter, Depends, HTTPException, status, Body
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from datetime import timedelta
+from app.database import get_db
+from app import models
+from app.auth import schemas
+from app.auth.utils import create_access_token, password_hasher
+from typing import Annotated
+
+router = APIRouter()
+
+@router.post("/register", response_model=schemas.UserOut)
+async def register(user: Annotated[
+        schemas.UserCreate,
+        Body(
+            examples=[
+                {
+                    "username": "Foo",
+                    "email": "a@a.co",
+                    "password": "supersecretpassword"
+                }
+            ],
+        ),
+    ], db: AsyncSession = Depends(get_db)):
+    result = await db.execute(select(models.User).where(models.User.email == user.email))
+    existing = result.scalars().first()
+    # Hand the connection back before bcrypt, as login does
+    await db.commit()
+    if existing:
+        raise HTTPException(status_code=400, detail="Email already registered")
+
+    db_user = models.User(
+        username=user.username,
+        email=user.email,
+        hashed_password=await password_hasher.hash(user.password)
+    )
+    db.add(db_user)
+    await db.commit()
+    await db.refresh(db_user)
+    return db_user
+
+@router.post("/login", response_model=schemas.Token)
+async def login(user: Annotated[
+        schemas.UserLogin,
+        Body(
+            examples=[
+                {
+                    "email": "a@a.co",
+                    "password": "supersecretpassword"
+                }
+            ],
+        ),
+    ], db: AsyncSession = Depends(get_db)):
+    result = await db.execute(select(models.User).where(models.User.email == user.email))
+    db_user = result.scalars().first()
+    # Hand the connection back before bcrypt, queued logins would otherwise drain the pool
+    await db.commit()
+    if not db_user or not await password_hasher.verify(user.password, db_user.hashed_password):
+        raise HTTPException(status_code=401, detail="Invalid credentials")
+
+    access_token = create_access_token(
+        data={"sub": str(db_user.id), "username": db_user.username},
+        expires_delta=timedelta(minutes=60)
+    )
+    return {"access_token": access_token, "token_type": "bearer"}
@@ -1,24 +1,24 @@
-from pydantic import BaseModel, EmailStr
-from typing import Optional
-from pydantic import BaseModel
-from pydantic.config import ConfigDict
-
-class UserCreate(BaseModel):
-    username: str
-    email: EmailStr
-    password: str
-
-class UserLogin(BaseModel):
-    email: EmailStr
-    password: str
-
-class UserOut(BaseModel):
-    id: int
-    username: str
-    email: EmailStr
-
-    model_config = ConfigDict(from_attributes=True)
-
-class Token(BaseModel):
-    access_token: str
-    token_type: str
+from pydantic import BaseModel, EmailStr
+from typing import Optional
+from pydantic import BaseModel
+from pydantic.config import ConfigDict
+
+class UserCreate(BaseModel):
+    username: str
+    email: EmailStr
+    password: str
+
+class UserLogin(BaseModel):
+    email: EmailStr
+    password: str
+
+class UserOut(BaseModel):
+    id: int
+    username: str
+    email: EmailStr
+
+    model_config = ConfigDict(from_attributes=True)
+
+class Token(BaseModel):
+    access_token: str
+    token_type: str
@@ -0,0 +1,111 @@
+"""Settings read from the environment (and .env) once, at import.
+
+Every module takes its configuration from here, so .env is parsed a
+single time per process.
+"""
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+def _flag(name: str, default: str = "false") -> bool:
+    return os.getenv(name, default).lower() in ("1", "true", "yes")
+
+
+# development or production; picks the defaults below
+APP_ENV = os.getenv("APP_ENV", "development")
+
+_PROFILES = {
+    "development": {
+        "DB_POOL_SIZE": "5",
+        "DB_MAX_OVERFLOW": "10",
+        "DB_POOL_PRE_PING": "false",
+        "DB_POOL_RECYCLE_SECONDS": "-1",
+        "DB_SQL_LOG_LEVEL": "INFO",
+    },
+    "production": {
+        "DB_POOL_SIZE": "20",
+        "DB_MAX_OVERFLOW": "10",
+        "DB_POOL_PRE_PING": "true",
+        "DB_POOL_RECYCLE_SECONDS": "1800",
+        "DB_SQL_LOG_LEVEL": "WARNING",
+    },
+}
+if APP_ENV not in _PROFILES:
+    raise ValueError(f"Unknown APP_ENV: {APP_ENV}")
+
+
+def _setting(name: str) -> str:
+    return os.getenv(name, _PROFILES[APP_ENV][name])
+
+
+DATABASE_URL = os.getenv("DATABASE_URL")
+DB_POOL_SIZE = int(_setting("DB_POOL_SIZE"))
+DB_MAX_OVERFLOW = int(_setting("DB_MAX_OVERFLOW"))
+DB_POOL_TIMEOUT_SECONDS = float(os.getenv("DB_POOL_TIMEOUT_SECONDS", "30"))
+DB_POOL_PRE_PING = _flag("DB_POOL_PRE_PING", _setting("DB_POOL_PRE_PING"))
+DB_POOL_RECYCLE_SECONDS = int(_setting("DB_POOL_RECYCLE_SECONDS"))
+# Checkouts that wait longer than this are logged as a sign the pool is too small
+DB_POOL_SLOW_CHECKOUT_MS = float(os.getenv("DB_POOL_SLOW_CHECKOUT_MS", "100"))
+# asyncpg only; 0 disables it, e.g. behind pgbouncer in transaction mode
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "100"))
+# INFO logs every statement, DEBUG also the rows
+DB_SQL_LOG_LEVEL = _setting("DB_SQL_LOG_LEVEL").upper()
+SECRET_KEY = os.getenv("SECRET_KEY")
+ALGORITHM = os.getenv("ALGORITHM")
+
+# Run pending migrations at boot instead of only checking the schema
+# version; meant for a single local process, deploys run the command once
+MIGRATE_ON_STARTUP = _flag("MIGRATE_ON_STARTUP")
+
+PUBSUB_BACKEND = os.getenv("PUBSUB_BACKEND", "memory")
+
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))
+USER_CACHE_TTL_SECONDS = float(os.getenv("USER_CACHE_TTL_SECONDS", "60"))
+# When enabled, tokens carrying a username claim are trusted as-is and no user lookup is made
+AUTH_TRUST_TOKEN_CLAIMS = _flag("AUTH_TRUST_TOKEN_CLAIMS")
+
+PASSWORD_HASH_EXECUTOR = os.getenv("PASSWORD_HASH_EXECUTOR", "thread")
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "4"))
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "256"))
+
+GLOBAL_SKETCH_TTL_SECONDS = float(os.getenv("GLOBAL_SKETCH_TTL_SECONDS", "30"))
+
+# Background expiry of sessions nobody stopped; only one worker sweeps at a time
+SWEEP_ENABLED = _flag("SWEEP_ENABLED", "true")
+SWEEP_INTERVAL_SECONDS = float(os.getenv("SWEEP_INTERVAL_SECONDS", "60"))
+SWEEP_BATCH_SIZE = int(os.getenv("SWEEP_BATCH_SIZE", "1000"))
+SWEEP_MAX_BATCHES = int(os.getenv("SWEEP_MAX_BATCHES", "50"))
+
+# Queue session starts/stops and write them in batches, one transaction per batch
+SESSION_WRITE_BEHIND = _flag("SESSION_WRITE_BEHIND")
+# sync: a stop answers once its batch is committed; batched: once it is queued
+SESSION_WRITE_ACK = os.getenv("SESSION_WRITE_ACK", "sync")
+SESSION_WRITE_BATCH_SIZE = int(os.getenv("SESSION_WRITE_BATCH_SIZE", "500"))
+SESSION_WRITE_FLUSH_MS = float(os.getenv("SESSION_WRITE_FLUSH_MS", "5"))
+SESSION_WRITE_MAX_PENDING = int(os.getenv("SESSION_WRITE_MAX_PENDING", "10000"))
+if SESSION_WRITE_ACK not in ("sync", "batched"):
+    raise ValueError(f"Unknown SESSION_WRITE_ACK: {SESSION_WRITE_ACK}")
+
+# Serialized leaderboard pages kept per (skip, limit), dropped when the board changes
+LEADERBOARD_CACHE_SIZE = int(os.getenv("LEADERBOARD_CACHE_SIZE", "256"))
+
+# Daily buckets older than this are deleted by the sweeper; keep at least
+# the widest leaderboard window (7 days)
+STATS_BUCKET_RETENTION_DAYS = int(os.getenv("STATS_BUCKET_RETENTION_DAYS", "8"))
+
+# Request, database and WebSocket metrics on /metrics, in the Prometheus text format
+METRICS_ENABLED = _flag("METRICS_ENABLED", "true")
+
+# Statements slower than SLOW_QUERY_MS are kept (the latest SLOW_QUERY_LOG_SIZE)
+# for GET /admin/slow-queries, with a plan captured at most once per shape
+# and interval; ANALYZE re-runs slow SELECTs on Postgres to time each step
+SLOW_QUERY_LOG = _flag("SLOW_QUERY_LOG", "true")
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "100"))
+SLOW_QUERY_LOG_SIZE = int(os.getenv("SLOW_QUERY_LOG_SIZE", "200"))
+SLOW_QUERY_EXPLAIN = _flag("SLOW_QUERY_EXPLAIN", "true")
+SLOW_QUERY_EXPLAIN_ANALYZE = _flag("SLOW_QUERY_EXPLAIN_ANALYZE")
+SLOW_QUERY_EXPLAIN_INTERVAL_SECONDS = float(os.getenv("SLOW_QUERY_EXPLAIN_INTERVAL_SECONDS", "60"))
+# Sent as X-Admin-Token to the /admin endpoints; unset, they answer 403
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
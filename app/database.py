@@ -1,16 +1,173 @@
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
-from dotenv import load_dotenv
-import os
-
-load_dotenv()
-
-DATABASE_URL = os.getenv("DATABASE_URL")
-
-engine = create_async_engine(DATABASE_URL, echo=True)
-SessionLocal = sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
-Base = declarative_base()
-
-async def get_db():
-    async with SessionLocal() as session:
-        yield session
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from app.config import (
+    DATABASE_URL,
+    DB_POOL_SIZE,
+    DB_MAX_OVERFLOW,
+    DB_POOL_TIMEOUT_SECONDS,
+    DB_POOL_PRE_PING,
+    DB_POOL_RECYCLE_SECONDS,
+    DB_POOL_SLOW_CHECKOUT_MS,
+    DB_STATEMENT_CACHE_SIZE,
+    DB_SQL_LOG_LEVEL,
+    METRICS_ENABLED,
+    SLOW_QUERY_LOG,
+)
+from app.metrics import registry
+from app.slow_queries import slow_query_log
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# Statement kinds with a series of their own; the rest count as OTHER
+STATEMENT_OPERATIONS = ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH")
+
+db_statement_seconds = registry.histogram(
+    "db_statement_duration_seconds", "Time the driver spent on one SQL statement.", ("operation",)
+)
+db_statement_errors = registry.counter("db_statement_errors_total", "SQL statements that raised.", ("operation",))
+db_pool_checkout_wait_seconds = registry.histogram(
+    "db_pool_checkout_wait_seconds", "Time spent waiting for a pooled connection."
+)
+
+
+class PoolStats:
+    """How long requests wait for a pooled connection."""
+
+    def __init__(self, slow_ms: float = DB_POOL_SLOW_CHECKOUT_MS):
+        self.slow_ms = slow_ms
+        self.reset()
+
+    def reset(self):
+        self.checkouts = 0
+        self.slow_checkouts = 0
+        self.wait_ms_total = 0.0
+        self.wait_ms_max = 0.0
+
+    def record(self, wait_ms: float, pool=None):
+        db_pool_checkout_wait_seconds.observe(wait_ms / 1000)
+        self.checkouts += 1
+        self.wait_ms_total += wait_ms
+        self.wait_ms_max = max(self.wait_ms_max, wait_ms)
+        if wait_ms >= self.slow_ms:
+            self.slow_checkouts += 1
+            logger.warning("Waited %.1f ms for a database connection (%s)", wait_ms, pool.status() if pool else "")
+
+    def snapshot(self):
+        return {
+            "checkouts": self.checkouts,
+            "slow_checkouts": self.slow_checkouts,
+            "wait_ms_avg": self.wait_ms_total / self.checkouts if self.checkouts else 0.0,
+            "wait_ms_max": self.wait_ms_max,
+        }
+
+
+pool_stats = PoolStats()
+
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """Queue pool that records how long each checkout waited."""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            pool_stats.record((time.perf_counter() - started) * 1000, self)
+
+
+def engine_options(database_url: str = DATABASE_URL):
+    """Keyword arguments for create_async_engine from the DB_* settings."""
+    url = make_url(database_url)
+    options = {
+        # echo writes each statement to stdout; only the development profile wants that
+        "echo": {"DEBUG": "debug", "INFO": True}.get(DB_SQL_LOG_LEVEL, False),
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+    if url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:"):
+        # In-memory SQLite lives in one connection, there is no pool to size
+        return options
+    options.update(
+        poolclass=TimedQueuePool,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT_SECONDS,
+        pool_recycle=DB_POOL_RECYCLE_SECONDS,
+    )
+    if url.get_driver_name() == "asyncpg":
+        options["connect_args"] = {"prepared_statement_cache_size": DB_STATEMENT_CACHE_SIZE}
+    return options
+
+
+logging.getLogger("sqlalchemy.engine").setLevel(DB_SQL_LOG_LEVEL)
+
+def statement_operation(statement: str) -> str:
+    words = statement[:24].split(None, 1)
+    operation = words[0].upper() if words else ""
+    return operation if operation in STATEMENT_OPERATIONS else "OTHER"
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    db_statement_seconds.observe(time.perf_counter() - context._started, statement_operation(statement))
+
+
+def _handle_error(exception_context):
+    if exception_context.statement is not None:
+        db_statement_errors.inc(statement_operation(exception_context.statement))
+
+
+def instrument_engine(engine):
+    """Time every statement the engine runs, through its cursor events."""
+    sync_engine = engine.sync_engine
+    event.listen(sync_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(sync_engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(sync_engine, "handle_error", _handle_error)
+
+
+def pool_status():
+    """Connections of the global engine's pool, read when /metrics is scraped."""
+    pool = engine.pool
+    if not hasattr(pool, "checkedout"):
+        return {}
+    # The pool was built with DB_MAX_OVERFLOW and has no public accessor for it
+    capacity = pool.size() + max(DB_MAX_OVERFLOW, 0)
+    return {
+        "size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "overflow": max(pool.overflow(), 0),
+        "utilization": pool.checkedout() / capacity if capacity else 0.0,
+    }
+
+
+def _pool_gauge(name: str):
+    status = pool_status()
+    return {(): status[name]} if name in status else {}
+
+
+registry.gauge("db_pool_size", "Connections the pool keeps open.", collect=lambda: _pool_gauge("size"))
+registry.gauge("db_pool_checked_out", "Pooled connections in use.", collect=lambda: _pool_gauge("checked_out"))
+registry.gauge("db_pool_overflow", "Connections open beyond the pool size.", collect=lambda: _pool_gauge("overflow"))
+registry.gauge(
+    "db_pool_utilization", "Connections in use over the most the pool will open.",
+    collect=lambda: _pool_gauge("utilization")
+)
+
+engine = create_async_engine(DATABASE_URL, **engine_options())
+if METRICS_ENABLED:
+    instrument_engine(engine)
+if SLOW_QUERY_LOG:
+    slow_query_log.attach(engine)
+SessionLocal = sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+Base = declarative_base()
+
+async def get_db():
+    async with SessionLocal() as session:
+        yield session
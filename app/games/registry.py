@@ -0,0 +1,76 @@
+import time
+from datetime import datetime
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.leaderboard.events import SCORES_CHANNEL
+from app.models import GameSession
+from app.pubsub import pubsub
+
+
+class ActiveSession:
+    __slots__ = ("session_id", "user_id", "started")
+
+    def __init__(self, session_id: int, user_id: int, started: float):
+        self.session_id = session_id
+        self.user_id = user_id
+        # time.monotonic() at start, so durations ignore wall clock jumps
+        self.started = started
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+
+class ActiveSessionRegistry:
+    """Started sessions this worker knows about, one per user.
+
+    A hint, not the source of truth: a session may be started or stopped
+    on another worker, or expired by the sweeper, without this registry
+    seeing it. Callers treat a hit as "probably still started" and let
+    the database have the last word in the write itself.
+    """
+
+    def __init__(self):
+        self._by_user = {}
+
+    def __len__(self):
+        return len(self._by_user)
+
+    def get(self, user_id: int):
+        return self._by_user.get(user_id)
+
+    def add(self, session_id: int, user_id: int, started: float = None):
+        self._by_user[user_id] = ActiveSession(session_id, user_id, time.monotonic() if started is None else started)
+
+    def discard(self, user_id: int, session_id: int = None):
+        active = self._by_user.get(user_id)
+        if active is not None and (session_id is None or active.session_id == session_id):
+            del self._by_user[user_id]
+
+    def prune(self, max_age: float):
+        for user_id in [a.user_id for a in self._by_user.values() if a.elapsed() > max_age]:
+            del self._by_user[user_id]
+
+    def clear(self):
+        self._by_user.clear()
+
+    async def load(self, db: AsyncSession):
+        """Rebuild from the started sessions in the database, e.g. at boot."""
+        result = await db.execute(
+            select(GameSession.id, GameSession.user_id, GameSession.start_time)
+            .where(GameSession.status == "started")
+        )
+        now_wall, now_mono = datetime.utcnow(), time.monotonic()
+        self.clear()
+        for session_id, user_id, start_time in result.all():
+            self.add(session_id, user_id, now_mono - (now_wall - start_time).total_seconds())
+
+
+active_sessions = ActiveSessionRegistry()
+
+
+def forget_stopped(payload: dict):
+    # Another worker (or this one) stopped the session
+    active_sessions.discard(payload["user_id"], payload.get("session_id"))
+
+
+pubsub.subscribe(SCORES_CHANNEL, forget_stopped)
@@ -1,116 +1,135 @@
-from fastapi import APIRouter, Depends, HTTPException, status,Query
-from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.future import select
-from datetime import datetime, timedelta
-from app.database import get_db
-from app.auth.auth_dependencies import get_current_user
-from app import models
-from app.models import User, GameSession
-from sqlalchemy import func, select
-from datetime import UTC
-
-router = APIRouter()
-
-@router.get("/", summary="Top 10 players by average deviation")
-async def get_leaderboard(
-    db: AsyncSession = Depends(get_db),
-    skip: int = Query(0, ge=0),
-    limit: int = Query(10, le=100)
-):
-    subquery = (
-        select(
-            GameSession.user_id,
-            func.count(GameSession.id).label("games_played"),
-            func.avg(GameSession.deviation).label("avg_deviation"),
-            func.min(GameSession.deviation).label("best_deviation")
-        )
-        .where(GameSession.status == "stopped")
-        .group_by(GameSession.user_id)
-        .subquery()
-    )
-
-    query = (
-        select(
-            User.username,
-            subquery.c.games_played,
-            subquery.c.avg_deviation,
-            subquery.c.best_deviation
-        )
-        .join(subquery, User.id == subquery.c.user_id)
-        .order_by(subquery.c.avg_deviation.asc())
-        .offset(skip)
-        .limit(limit)
-    )
-
-    result = await db.execute(query)
-    leaderboard = result.all()
-
-    return [
-        {
-            "username": row.username,
-            "total_games": row.games_played,
-            "average_deviation_ms": round(row.avg_deviation, 2),
-            "best_deviation_ms": round(row.best_deviation, 2)
-        }
-        for row in leaderboard
-    ]
-
-
-@router.post("/start")
-async def start_game(db: AsyncSession = Depends(get_db), current_user: models.User = Depends(get_current_user)):
-    # Check for existing active session
-    result = await db.execute(
-        select(models.GameSession).where(
-            models.GameSession.user_id == current_user.id,
-            models.GameSession.status == "started"
-        )
-    )
-    existing_session = result.scalars().first()
-    if existing_session:
-        raise HTTPException(status_code=400, detail="Existing session already in progress")
-
-    new_session = models.GameSession(
-        user_id=current_user.id,
-        start_time=datetime.utcnow(),
-        status="started"
-    )
-    db.add(new_session)
-    await db.commit()
-    await db.refresh(new_session)
-    return {"session_id": new_session.id, "message": "Timer started"}
-
-@router.post("/{session_id}/stop")
-async def stop_game(session_id: int, db: AsyncSession = Depends(get_db), current_user: models.User = Depends(get_current_user)):
-    result = await db.execute(
-        select(models.GameSession).where(
-            models.GameSession.id == session_id,
-            models.GameSession.user_id == current_user.id
-        )
-    )
-    session = result.scalars().first()
-
-    if not session:
-        raise HTTPException(status_code=404, detail="Session not found")
-
-    if session.status != "started":
-        raise HTTPException(status_code=400, detail="Session already stopped or expired")
-
-    now = datetime.utcnow()
-    if now - session.start_time > timedelta(minutes=30):
-        session.status = "expired"
-        await db.commit()
-        raise HTTPException(status_code=400, detail="Session expired")
-
-    session.stop_time = now
-    duration = (session.stop_time - session.start_time).total_seconds() * 1000  # in ms
-    deviation = abs(duration - 10000)
-    session.duration = duration
-    session.deviation = deviation
-    session.status = "stopped"
-    await db.commit()
-
-    return {
-        "message": "Timer stopped",
-        "duration_ms": round(duration, 2),
-        "deviation_ms": round(deviation, 2)
-    }
+from fastapi import APIRouter, Depends, HTTPException, status,Query, Request
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from datetime import datetime
+from app.database import get_db
+from app.auth.auth_dependencies import get_current_user
+from app import models
+from app.models import User, GameSession
+from app.leaderboard.stats import record_game_result
+from app.leaderboard.routes import serve_leaderboard
+from app.leaderboard.events import publish_score
+from app.analytics.distribution import record_deviation, global_sketch
+from app.games.utils import SESSION_TIMEOUT, close_session
+from app.games.registry import active_sessions
+from app.games.writer import session_writer
+from sqlalchemy import func, select
+from sqlalchemy.exc import IntegrityError
+from datetime import UTC
+from typing import Annotated, Optional
+import time
+
+router = APIRouter()
+
+@router.get("/", summary="Top 10 players by average deviation")
+async def get_leaderboard(
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+    skip: int = Query(0, ge=0),
+    limit: int = Query(10, ge=1, le=100),
+    cursor: Annotated[Optional[str], Query(description="X-Next-Cursor from the previous page; replaces skip")] = None
+):
+    return await serve_leaderboard(request, db, "games", leaderboard_row, skip, limit, cursor=cursor)
+
+
+def leaderboard_row(row):
+    return {
+        "username": row.username,
+        "total_games": row.games_played,
+        "average_deviation_ms": round(row.avg_deviation, 2),
+        "best_deviation_ms": round(row.best_deviation, 2)
+    }
+
+
+@router.post("/start")
+async def start_game(db: AsyncSession = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+    active = active_sessions.get(current_user.id)
+    if active is not None and active.elapsed() <= SESSION_TIMEOUT.total_seconds():
+        raise HTTPException(status_code=400, detail="Existing session already in progress")
+
+    # uq_game_sessions_user_id_started rejects a second started session
+    started = time.monotonic()
+    if session_writer.running:
+        # Hand back the connection the user lookup took; the writer needs one
+        await db.commit()
+        try:
+            session_id = await session_writer.start_session(current_user.id, datetime.utcnow())
+        except IntegrityError:
+            raise HTTPException(status_code=400, detail="Existing session already in progress")
+    else:
+        new_session = models.GameSession(
+            user_id=current_user.id,
+            start_time=datetime.utcnow(),
+            status="started"
+        )
+        db.add(new_session)
+        try:
+            await db.commit()
+        except IntegrityError:
+            await db.rollback()
+            raise HTTPException(status_code=400, detail="Existing session already in progress")
+        session_id = new_session.id
+    active_sessions.add(session_id, current_user.id, started)
+    return {"session_id": session_id, "message": "Timer started"}
+
+@router.post("/{session_id}/stop")
+async def stop_game(session_id: int, db: AsyncSession = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+    now = datetime.utcnow()
+    active = active_sessions.get(current_user.id)
+    stats = None
+    if active is not None and active.session_id == session_id and active.elapsed() <= SESSION_TIMEOUT.total_seconds():
+        duration = active.elapsed() * 1000  # in ms
+        deviation = abs(duration - 10000)
+        if session_writer.running:
+            await db.commit()
+            if await session_writer.stop_session(current_user, session_id, now, duration, deviation):
+                return stopped_response(duration, deviation)
+        else:
+            # No read: the update only matches if the session is still ours and running
+            stats = await close_session(db, session_id, current_user.id, now, duration, deviation)
+
+    if stats is None:
+        # Not known to this worker, or changed behind its back
+        result = await db.execute(
+            select(models.GameSession).where(
+                models.GameSession.id == session_id,
+                models.GameSession.user_id == current_user.id
+            )
+        )
+        session = result.scalars().first()
+
+        if not session:
+            raise HTTPException(status_code=404, detail="Session not found")
+
+        if session.status != "started":
+            active_sessions.discard(current_user.id, session_id)
+            raise HTTPException(status_code=400, detail="Session already stopped or expired")
+
+        if now - session.start_time > SESSION_TIMEOUT:
+            session.status = "expired"
+            await db.commit()
+            active_sessions.discard(current_user.id, session_id)
+            raise HTTPException(status_code=400, detail="Session expired")
+
+        session.stop_time = now
+        duration = (session.stop_time - session.start_time).total_seconds() * 1000  # in ms
+        deviation = abs(duration - 10000)
+        session.duration = duration
+        session.deviation = deviation
+        session.status = "stopped"
+        stats = await record_game_result(db, current_user.id, deviation, now)
+        await record_deviation(db, current_user.id, deviation, now)
+    await db.commit()
+
+    active_sessions.discard(current_user.id, session_id)
+    global_sketch.add(deviation)
+    await publish_score(current_user, stats, session_id, deviation, now)
+    return stopped_response(duration, deviation)
+
+
+def stopped_response(duration: float, deviation: float):
+    return {
+        "message": "Timer stopped",
+        "duration_ms": round(duration, 2),
+        "deviation_ms": round(deviation, 2)
+    }
@@ -0,0 +1,155 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import delete, select, text, update
+from app.config import SWEEP_INTERVAL_SECONDS, SWEEP_BATCH_SIZE, SWEEP_MAX_BATCHES, STATS_BUCKET_RETENTION_DAYS
+from app.database import engine
+from app.games.utils import SESSION_TIMEOUT
+from app.games.registry import active_sessions
+from app.leaderboard.ranking import WINDOW_DAYS
+from app.metrics import registry
+from app.models import GameSession, PlayerStatsBucket
+
+# Held for the length of a sweep so only one worker runs it
+SWEEP_LOCK_ID = 7214_0002
+
+logger = logging.getLogger(__name__)
+
+
+class SessionSweeper:
+    """Marks started sessions older than SESSION_TIMEOUT as expired.
+
+    Each batch is one set-based UPDATE over at most ``batch_size`` rows, in
+    its own transaction, so locks stay short. A run stops after
+    ``max_batches`` and the rest is left for the next one. On Postgres a
+    run only goes ahead if it gets the advisory lock, so with many
+    workers one sweeps and the others skip.
+
+    The same run compacts player_stats_buckets: days older than every
+    leaderboard window are deleted, player_stats already holds them.
+    """
+
+    def __init__(self, interval: float = SWEEP_INTERVAL_SECONDS, batch_size: int = SWEEP_BATCH_SIZE, max_batches: int = SWEEP_MAX_BATCHES, bind=engine):
+        self.interval = interval
+        self.batch_size = batch_size
+        self.max_batches = max_batches
+        self.bind = bind
+        self._task = None
+        self.stats = {
+            "runs": 0,
+            "skipped": 0,
+            "errors": 0,
+            "expired": 0,
+            "last_expired": 0,
+            "buckets_compacted": 0,
+            "last_duration_ms": 0.0,
+            "last_run_at": None,
+        }
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def sweep(self, now: datetime = None):
+        """Run one sweep. Returns the number of sessions expired, or None
+        when another worker holds the lock."""
+        now = now or datetime.utcnow()
+        cutoff = now - SESSION_TIMEOUT
+        oldest_day = now.date() - timedelta(days=max(STATS_BUCKET_RETENTION_DAYS, *WINDOW_DAYS.values()) - 1)
+        # Every worker drops its own timed out entries, lock or not
+        active_sessions.prune(SESSION_TIMEOUT.total_seconds())
+        started = time.perf_counter()
+        expired = 0
+        # One connection throughout, the Postgres lock belongs to it
+        async with self.bind.connect() as conn:
+            if not await self._acquire(conn):
+                self.stats["skipped"] += 1
+                return None
+            try:
+                for _ in range(self.max_batches):
+                    stale = (
+                        select(GameSession.id)
+                        .where(GameSession.status == "started", GameSession.start_time < cutoff)
+                        .order_by(GameSession.id)
+                        .limit(self.batch_size)
+                        .with_for_update(skip_locked=True)
+                    )
+                    result = await conn.execute(
+                        update(GameSession)
+                        .where(GameSession.id.in_(stale.scalar_subquery()))
+                        .values(status="expired")
+                    )
+                    await conn.commit()
+                    expired += result.rowcount
+                    if result.rowcount < self.batch_size:
+                        break
+                result = await conn.execute(delete(PlayerStatsBucket).where(PlayerStatsBucket.day < oldest_day))
+                await conn.commit()
+                self.stats["buckets_compacted"] += result.rowcount
+            finally:
+                await self._release(conn)
+
+        self.stats["runs"] += 1
+        self.stats["expired"] += expired
+        self.stats["last_expired"] = expired
+        self.stats["last_duration_ms"] = (time.perf_counter() - started) * 1000
+        self.stats["last_run_at"] = datetime.utcnow().isoformat()
+        if expired:
+            logger.info("Expired %d abandoned game sessions", expired)
+        return expired
+
+    async def _acquire(self, conn):
+        if conn.dialect.name != "postgresql":
+            return True
+        # Session-level lock, so it outlives the per-batch commits
+        acquired = await conn.scalar(text("SELECT pg_try_advisory_lock(:id)"), {"id": SWEEP_LOCK_ID})
+        await conn.commit()
+        return acquired
+
+    async def _release(self, conn):
+        if conn.dialect.name != "postgresql":
+            return
+        await conn.rollback()
+        await conn.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": SWEEP_LOCK_ID})
+        await conn.commit()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.sweep()
+            except Exception:
+                self.stats["errors"] += 1
+                logger.exception("Session sweep failed")
+
+
+sweeper = SessionSweeper()
+
+registry.counter("sweeper_runs_total", "Sweeps this worker ran.", collect=lambda: {(): sweeper.stats["runs"]})
+registry.counter(
+    "sweeper_skipped_total", "Sweeps skipped because another worker held the lock.",
+    collect=lambda: {(): sweeper.stats["skipped"]}
+)
+registry.counter("sweeper_errors_total", "Sweeps that failed.", collect=lambda: {(): sweeper.stats["errors"]})
+registry.counter(
+    "sweeper_sessions_expired_total", "Abandoned game sessions marked expired.",
+    collect=lambda: {(): sweeper.stats["expired"]}
+)
+registry.counter(
+    "sweeper_buckets_compacted_total", "player_stats_buckets rows past every window deleted.",
+    collect=lambda: {(): sweeper.stats["buckets_compacted"]}
+)
+registry.gauge(
+    "sweeper_last_duration_seconds", "Time the last sweep took.",
+    collect=lambda: {(): sweeper.stats["last_duration_ms"] / 1000}
+)
@@ -1,37 +1,46 @@
-from sqlalchemy import select, func
-from app.models import GameSession, User
-
-async def get_leaderboard_data(db):
-    subquery = (
-        select(
-            GameSession.user_id,
-            func.count(GameSession.id).label("total_games"),
-            func.avg(GameSession.deviation).label("avg_deviation"),
-            func.min(GameSession.deviation).label("best_deviation")
-        )
-        .where(GameSession.status == "stopped")
-        .group_by(GameSession.user_id)
-        .subquery()
-    )
-
-    query = (
-        select(
-            User.username,
-            subquery.c.total_games,
-            subquery.c.avg_deviation,
-            subquery.c.best_deviation
-        )
-        .join(subquery, User.id == subquery.c.user_id)
-        .order_by(subquery.c.avg_deviation.asc())
-    )
-    result = await db.execute(query)
-    rows = result.all()
-    return [
-        {
-            "username": r.username,
-            "total_games": r.total_games,
-            "average_deviation": round(r.avg_deviation, 2),
-            "best_deviation": round(r.best_deviation, 2)
-        }
-        for r in rows
-    ]
+from datetime import timedelta
+from sqlalchemy import update
+from app.analytics.distribution import record_deviation
+from app.leaderboard.stats import leaderboard_query, record_game_result
+from app.models import GameSession
+
+# A started session older than this can no longer be stopped
+SESSION_TIMEOUT = timedelta(minutes=30)
+
+async def get_leaderboard_data(db):
+    result = await db.execute(leaderboard_query())
+    rows = result.all()
+    return [
+        {
+            "username": r.username,
+            "total_games": r.games_played,
+            "average_deviation": round(r.avg_deviation, 2),
+            "best_deviation": round(r.best_deviation, 2)
+        }
+        for r in rows
+    ]
+
+
+async def close_session(db, session_id: int, user_id: int, now, duration: float, deviation: float):
+    """Stop a session without reading it first and fold it into the stats.
+
+    The UPDATE only matches a session of ``user_id`` that is still started
+    and not timed out. Returns the player's new stats, or None when it
+    did not match. Runs inside the caller's transaction.
+    """
+    result = await db.execute(
+        update(GameSession)
+        .where(
+            GameSession.id == session_id,
+            GameSession.user_id == user_id,
+            GameSession.status == "started",
+            GameSession.start_time >= now - SESSION_TIMEOUT
+        )
+        .values(stop_time=now, duration=duration, deviation=deviation, status="stopped")
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount != 1:
+        return None
+    stats = await record_game_result(db, user_id, deviation, now)
+    await record_deviation(db, user_id, deviation, now)
+    return stats
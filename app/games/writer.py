@@ -0,0 +1,241 @@
+import asyncio
+import logging
+import time
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+from fastapi import HTTPException
+from app.config import (
+    SESSION_WRITE_ACK,
+    SESSION_WRITE_BATCH_SIZE,
+    SESSION_WRITE_FLUSH_MS,
+    SESSION_WRITE_MAX_PENDING,
+)
+from app.database import SessionLocal
+from app.analytics.distribution import global_sketch
+from app.games.registry import active_sessions
+from app.games.utils import close_session
+from app.leaderboard.events import publish_score
+from app.metrics import registry
+from app.models import GameSession
+
+logger = logging.getLogger(__name__)
+
+
+class _Write:
+    __slots__ = ("kind", "user", "user_id", "session_id", "at", "duration", "deviation", "future")
+
+    def __init__(self, kind, user_id, at, user=None, session_id=None, duration=None, deviation=None):
+        self.kind = kind
+        self.user = user
+        self.user_id = user_id
+        self.session_id = session_id
+        self.at = at
+        self.duration = duration
+        self.deviation = deviation
+        self.future = asyncio.get_running_loop().create_future()
+
+
+class SessionWriter:
+    """Write-behind queue for game session starts and stops.
+
+    Writes wait at most ``flush_ms`` (or until ``batch_size`` are queued)
+    and are then committed together: the starts as one multi-row INSERT,
+    the stops as conditional UPDATEs, all in one transaction. If the batch
+    hits a constraint it is replayed one write per transaction, so only
+    the offending write fails. Starts always wait for their batch, since
+    the response carries the new id; stops wait too with ``ack="sync"``,
+    or return as soon as they are queued with ``ack="batched"``. Once
+    ``max_pending`` writes are queued new ones get a 503.
+    """
+
+    def __init__(self, batch_size: int = SESSION_WRITE_BATCH_SIZE, flush_ms: float = SESSION_WRITE_FLUSH_MS, max_pending: int = SESSION_WRITE_MAX_PENDING, ack: str = SESSION_WRITE_ACK):
+        self.batch_size = batch_size
+        self.flush_ms = flush_ms
+        self.max_pending = max_pending
+        self.ack = ack
+        self._queue = []
+        self._has_work = None
+        self._full = None
+        self._closing = False
+        self._task = None
+        self.stats = {
+            "batches": 0,
+            "records": 0,
+            "max_batch_seen": 0,
+            "replayed_batches": 0,
+            "rejected": 0,
+            "failed": 0,
+            "stale_stops": 0,
+            "last_flush_ms": 0.0,
+        }
+
+    @property
+    def running(self):
+        return self._task is not None
+
+    @property
+    def pending(self):
+        return len(self._queue)
+
+    def start(self):
+        if self._task is None:
+            self._has_work = asyncio.Event()
+            self._full = asyncio.Event()
+            self._closing = False
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Write out everything queued, then stop."""
+        if self._task is not None:
+            self._closing = True
+            self._has_work.set()
+            self._full.set()
+            await self._task
+            self._task = None
+
+    async def start_session(self, user_id: int, start_time) -> int:
+        """Queue a new started session and return its id once committed.
+
+        Raises IntegrityError if the user already has a started session.
+        """
+        return await self._enqueue(_Write("start", user_id, start_time))
+
+    async def stop_session(self, user, session_id: int, now, duration: float, deviation: float) -> bool:
+        """Queue a stop. Returns False if, once written, the session turned
+        out not to be running any more; always True with batched acks."""
+        write = _Write("stop", user.id, now, user, session_id, duration, deviation)
+        if self.ack == "batched":
+            self._put(write)
+            # Let a following start through; the batch applies stops first
+            active_sessions.discard(user.id, session_id)
+            return True
+        return await self._enqueue(write) is not None
+
+    def _put(self, write):
+        if len(self._queue) >= self.max_pending:
+            self.stats["rejected"] += 1
+            raise HTTPException(status_code=503, detail="Too many game requests, try again shortly")
+        self._queue.append(write)
+        self._has_work.set()
+        if len(self._queue) >= self.batch_size:
+            self._full.set()
+
+    async def _enqueue(self, write):
+        self._put(write)
+        return await write.future
+
+    async def _run(self):
+        while True:
+            await self._has_work.wait()
+            if not self._closing:
+                try:
+                    await asyncio.wait_for(self._full.wait(), self.flush_ms / 1000)
+                except asyncio.TimeoutError:
+                    pass
+            self._has_work.clear()
+            self._full.clear()
+            await self.flush()
+            if self._closing and not self._queue:
+                return
+
+    async def flush(self):
+        while self._queue:
+            batch = self._queue[:self.batch_size]
+            del self._queue[:self.batch_size]
+            started = time.perf_counter()
+            await self._write(batch)
+            self.stats["batches"] += 1
+            self.stats["records"] += len(batch)
+            self.stats["max_batch_seen"] = max(self.stats["max_batch_seen"], len(batch))
+            self.stats["last_flush_ms"] = (time.perf_counter() - started) * 1000
+
+    async def _write(self, batch):
+        try:
+            async with SessionLocal() as db:
+                results = await self._apply(db, batch)
+                await db.commit()
+        except IntegrityError:
+            self.stats["replayed_batches"] += 1
+            results = []
+            for write in batch:
+                try:
+                    async with SessionLocal() as db:
+                        applied = await self._apply(db, [write])
+                        await db.commit()
+                    # Only once committed, or a failed commit would add a second result
+                    results += applied
+                except Exception as exc:
+                    results.append(exc)
+        except Exception as exc:
+            logger.exception("Session write batch failed")
+            results = [exc] * len(batch)
+
+        for write, result in zip(batch, results):
+            await self._settle(write, result)
+
+    async def _apply(self, db, batch):
+        """Run a batch's statements; returns one result per write, in order."""
+        results = {}
+        # Stops first, so a user's stop and next start can share a batch
+        for write in batch:
+            if write.kind == "stop":
+                results[id(write)] = await close_session(db, write.session_id, write.user_id, write.at, write.duration, write.deviation)
+        starts = [write for write in batch if write.kind == "start"]
+        if starts:
+            ids = await db.scalars(
+                insert(GameSession).returning(GameSession.id, sort_by_parameter_order=True),
+                [{"user_id": w.user_id, "start_time": w.at, "status": "started"} for w in starts]
+            )
+            for write, session_id in zip(starts, ids.all()):
+                results[id(write)] = session_id
+        return [results[id(write)] for write in batch]
+
+    async def _settle(self, write, result):
+        unacked = self.ack == "batched" and write.kind == "stop"
+        if isinstance(result, Exception):
+            self.stats["failed"] += 1
+            if unacked:
+                logger.warning("Queued stop of session %s failed: %r", write.session_id, result)
+            elif not write.future.done():
+                write.future.set_exception(result)
+            return
+        if write.kind == "stop":
+            if result is None:
+                # Stopped or expired behind our back
+                self.stats["stale_stops"] += 1
+                if unacked:
+                    logger.warning("Queued stop of session %s matched no running session", write.session_id)
+            else:
+                active_sessions.discard(write.user_id, write.session_id)
+                global_sketch.add(write.deviation)
+                await publish_score(write.user, result, write.session_id, write.deviation, write.at)
+        if not write.future.done():
+            write.future.set_result(result)
+
+session_writer = SessionWriter()
+
+
+def _writer_stat(name: str):
+    return lambda: {(): session_writer.stats[name]}
+
+
+registry.gauge("session_writer_pending", "Game writes queued for the next batch.", collect=lambda: {(): session_writer.pending})
+registry.counter("session_writer_batches_total", "Batches written.", collect=_writer_stat("batches"))
+registry.counter("session_writer_records_total", "Game writes applied in batches.", collect=_writer_stat("records"))
+registry.counter(
+    "session_writer_replayed_batches_total", "Batches retried one write at a time after a conflict.",
+    collect=_writer_stat("replayed_batches")
+)
+registry.counter(
+    "session_writer_rejected_total", "Game writes turned away with a 503 because the queue was full.",
+    collect=_writer_stat("rejected")
+)
+registry.counter("session_writer_failed_total", "Game writes that failed.", collect=_writer_stat("failed"))
+registry.counter(
+    "session_writer_stale_stops_total", "Stops that found their session already stopped or expired.",
+    collect=_writer_stat("stale_stops")
+)
+registry.gauge(
+    "session_writer_last_flush_seconds", "Time the last batch took to write.",
+    collect=lambda: {(): session_writer.stats["last_flush_ms"] / 1000}
+)
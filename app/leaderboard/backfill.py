@@ -0,0 +1,27 @@
+"""Rebuild the player_stats, player_stats_buckets and player_sketches tables
+from game_sessions.
+
+Usage: python -m app.leaderboard.backfill
+"""
+import asyncio
+from app.database import engine, SessionLocal
+from app.migrations.runner import upgrade
+from app.config import STATS_BUCKET_RETENTION_DAYS
+from app.leaderboard.stats import rebuild_player_stats, rebuild_stats_buckets
+from app.analytics.distribution import rebuild_player_sketches
+
+
+async def main():
+    await upgrade(engine)
+    async with SessionLocal() as db:
+        players = await rebuild_player_stats(db)
+        buckets = await rebuild_stats_buckets(db, STATS_BUCKET_RETENTION_DAYS)
+        sketches = await rebuild_player_sketches(db)
+    await engine.dispose()
+    print(f"player_stats rebuilt for {players} players")
+    print(f"player_stats_buckets rebuilt, {buckets} buckets")
+    print(f"player_sketches rebuilt for {sketches} players")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,74 @@
+import hashlib
+from collections import OrderedDict
+from fastapi import Request, Response
+from app.config import LEADERBOARD_CACHE_SIZE
+from app.websockets.encoding import dumps_json
+
+
+class Page:
+    """A response body serialized once, with an ETag derived from it.
+
+    The ETag depends only on the content, so every worker hands out the
+    same one for the same board.
+    """
+
+    __slots__ = ("body", "etag", "headers")
+
+    def __init__(self, rows, headers: dict = None):
+        self.headers = headers or {}
+        self.body = dumps_json(rows).encode()
+        self.etag = '"' + hashlib.blake2b(self.body, digest_size=12).hexdigest() + '"'
+
+    def matches(self, if_none_match: str) -> bool:
+        if not if_none_match:
+            return False
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+        return "*" in tags or any(tag.removeprefix("W/") == self.etag for tag in tags)
+
+    def response(self, request: Request) -> Response:
+        # no-cache: clients may keep the body but must revalidate each time
+        headers = {**self.headers, "ETag": self.etag, "Cache-Control": "no-cache"}
+        if self.matches(request.headers.get("if-none-match")):
+            return Response(status_code=304, headers=headers)
+        return Response(self.body, media_type="application/json", headers=headers)
+
+
+class PageCache:
+    """Leaderboard pages per key, valid for one leaderboard index version.
+
+    Nothing is invalidated explicitly: the index bumps its version on every
+    change, and a page cached for an older version is rebuilt on the next
+    request. Bounded LRU, since (skip, limit) comes from the client.
+    """
+
+    def __init__(self, maxsize: int = LEADERBOARD_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._pages = OrderedDict()
+
+    def __len__(self):
+        return len(self._pages)
+
+    def get(self, key, version: int):
+        item = self._pages.get(key)
+        if item is None or item[0] != version:
+            self.misses += 1
+            return None
+        self._pages.move_to_end(key)
+        self.hits += 1
+        return item[1]
+
+    def set(self, key, version: int, page: Page):
+        if self.maxsize <= 0:
+            return
+        self._pages[key] = (version, page)
+        self._pages.move_to_end(key)
+        while len(self._pages) > self.maxsize:
+            self._pages.popitem(last=False)
+
+    def clear(self):
+        self._pages.clear()
+
+
+leaderboard_pages = PageCache()
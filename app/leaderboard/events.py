@@ -0,0 +1,68 @@
+import logging
+from datetime import date
+from app.database import SessionLocal
+from app.pubsub import pubsub
+from app.leaderboard.ranking import leaderboard_index, window_boards, LeaderboardEntry
+from app.websockets.leaderboard import publishers
+
+SCORES_CHANNEL = "scores"
+
+logger = logging.getLogger(__name__)
+
+
+async def publish_score(user, stats, session_id: int = None, deviation: float = None, played_at=None):
+    """Announce a player's new stats to every worker once they are committed.
+
+    ``deviation`` and ``played_at`` describe the game itself, for the
+    windowed boards.
+    """
+    payload = {
+        "user_id": user.id,
+        "session_id": session_id,
+        "deviation": deviation,
+        "played_on": played_at.date().isoformat() if played_at is not None else None,
+        "username": user.username,
+        "games_played": stats.games_played,
+        "avg_deviation": stats.avg_deviation,
+        "best_deviation": stats.best_deviation,
+    }
+    try:
+        await pubsub.publish(SCORES_CHANNEL, payload)
+    except Exception:
+        # The game is already committed; keep at least this worker current
+        logger.exception("Could not publish score event")
+        apply_score(payload)
+
+
+def apply_score(payload: dict):
+    if leaderboard_index.ready:
+        leaderboard_index.upsert(LeaderboardEntry(
+            payload["user_id"],
+            payload["username"],
+            payload["games_played"],
+            payload["avg_deviation"],
+            payload["best_deviation"]
+        ))
+    played_on = payload.get("played_on")
+    for board in window_boards.values():
+        board.record(
+            payload["user_id"],
+            payload["username"],
+            payload.get("deviation"),
+            date.fromisoformat(played_on) if played_on else None
+        )
+    for publisher in publishers.values():
+        publisher.notify()
+
+
+async def resync():
+    async with SessionLocal() as db:
+        await leaderboard_index.warm(db)
+        for board in window_boards.values():
+            await board.warm(db)
+    for publisher in publishers.values():
+        publisher.notify()
+
+
+pubsub.subscribe(SCORES_CHANNEL, apply_score)
+pubsub.on_resync(resync)
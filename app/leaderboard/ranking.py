@@ -0,0 +1,296 @@
+import asyncio
+import random
+from datetime import date, datetime, timedelta
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models import User, PlayerStats
+from app.leaderboard.stats import window_totals
+
+MAX_LEVEL = 32
+LEVEL_PROBABILITY = 0.25
+# Rollups a window board tries while games keep being recorded before it gives up
+WARM_ATTEMPTS = 3
+
+
+class LeaderboardEntry:
+    __slots__ = ("user_id", "username", "games_played", "avg_deviation", "best_deviation")
+
+    def __init__(self, user_id: int, username: str, games_played: int, avg_deviation: float, best_deviation: float):
+        self.user_id = user_id
+        self.username = username
+        self.games_played = games_played
+        self.avg_deviation = avg_deviation
+        self.best_deviation = best_deviation
+
+    @property
+    def key(self):
+        return (self.avg_deviation, self.user_id)
+
+
+class _Node:
+    __slots__ = ("key", "entry", "next", "span")
+
+    def __init__(self, key, entry, level: int):
+        self.key = key
+        self.entry = entry
+        self.next = [None] * level
+        self.span = [0] * level
+
+
+class RankedLeaderboard:
+    """In-memory leaderboard ordered by (avg_deviation, user_id).
+
+    Backed by an indexable skip list, so inserts, removals, rank lookups and
+    the start of any page are O(log n). Ranks are 1-based.
+    """
+
+    def __init__(self):
+        # Never goes back, so anything tagged with a version stays comparable across resets
+        self.version = 0
+        self.reset()
+
+    def reset(self):
+        self._head = _Node(None, None, MAX_LEVEL)
+        self._level = 1
+        self._size = 0
+        self._entries = {}
+        self.ready = False
+        self.version += 1
+
+    def __len__(self):
+        return self._size
+
+    def __contains__(self, user_id):
+        return user_id in self._entries
+
+    def get(self, user_id: int):
+        return self._entries.get(user_id)
+
+    def load(self, entries):
+        self.reset()
+        for entry in entries:
+            self._entries[entry.user_id] = entry
+            self._insert(entry.key, entry)
+        self.ready = True
+        self.version += 1
+
+    async def warm(self, db: AsyncSession):
+        result = await db.execute(
+            select(
+                PlayerStats.user_id,
+                User.username,
+                PlayerStats.games_played,
+                PlayerStats.avg_deviation,
+                PlayerStats.best_deviation
+            ).join(User, User.id == PlayerStats.user_id)
+        )
+        self.load(LeaderboardEntry(*row) for row in result.all())
+
+    def upsert(self, entry: LeaderboardEntry):
+        previous = self._entries.get(entry.user_id)
+        if previous is not None:
+            self._delete(previous.key)
+        self._entries[entry.user_id] = entry
+        self._insert(entry.key, entry)
+        self.version += 1
+
+    def remove(self, user_id: int):
+        previous = self._entries.pop(user_id, None)
+        if previous is not None:
+            self._delete(previous.key)
+            self.version += 1
+
+    def rank_of(self, user_id: int):
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return None
+        key = entry.key
+        rank = 0
+        node = self._head
+        for i in reversed(range(self._level)):
+            while node.next[i] is not None and node.next[i].key <= key:
+                rank += node.span[i]
+                node = node.next[i]
+            if node.key == key:
+                return rank
+        return None
+
+    def page(self, skip: int = 0, limit: int = 10):
+        if skip < 0:
+            raise ValueError(f"skip must not be negative, got {skip}")
+        if limit <= 0 or skip >= self._size:
+            return []
+        node = self._node_at(skip + 1)
+        rows = []
+        while node is not None and len(rows) < limit:
+            rows.append(node.entry)
+            node = node.next[0]
+        return rows
+
+    def page_after(self, key, limit: int = 10):
+        """Up to ``limit`` entries ranked after ``key``, an (avg_deviation,
+        user_id) pair that need not be on the board any more."""
+        node = self._head
+        for i in reversed(range(self._level)):
+            while node.next[i] is not None and node.next[i].key <= key:
+                node = node.next[i]
+        node = node.next[0]
+        rows = []
+        while node is not None and len(rows) < limit:
+            rows.append(node.entry)
+            node = node.next[0]
+        return rows
+
+    def top(self, n: int = 10):
+        return self.page(0, n)
+
+    def _node_at(self, rank: int):
+        traversed = 0
+        node = self._head
+        for i in reversed(range(self._level)):
+            while node.next[i] is not None and traversed + node.span[i] <= rank:
+                traversed += node.span[i]
+                node = node.next[i]
+            if traversed == rank:
+                return node
+        return None
+
+    def _random_level(self):
+        level = 1
+        while level < MAX_LEVEL and random.random() < LEVEL_PROBABILITY:
+            level += 1
+        return level
+
+    def _insert(self, key, entry):
+        update = [None] * MAX_LEVEL
+        rank = [0] * MAX_LEVEL
+        node = self._head
+        for i in reversed(range(self._level)):
+            rank[i] = 0 if i == self._level - 1 else rank[i + 1]
+            while node.next[i] is not None and node.next[i].key < key:
+                rank[i] += node.span[i]
+                node = node.next[i]
+            update[i] = node
+
+        level = self._random_level()
+        if level > self._level:
+            for i in range(self._level, level):
+                rank[i] = 0
+                update[i] = self._head
+                self._head.span[i] = self._size
+            self._level = level
+
+        new = _Node(key, entry, level)
+        for i in range(level):
+            new.next[i] = update[i].next[i]
+            update[i].next[i] = new
+            new.span[i] = update[i].span[i] - (rank[0] - rank[i])
+            update[i].span[i] = rank[0] - rank[i] + 1
+        for i in range(level, self._level):
+            update[i].span[i] += 1
+        self._size += 1
+
+    def _delete(self, key):
+        update = [None] * MAX_LEVEL
+        node = self._head
+        for i in reversed(range(self._level)):
+            while node.next[i] is not None and node.next[i].key < key:
+                node = node.next[i]
+            update[i] = node
+
+        target = node.next[0]
+        if target is None or target.key != key:
+            return
+        for i in range(self._level):
+            if update[i].next[i] is target:
+                update[i].span[i] += target.span[i] - 1
+                update[i].next[i] = target.next[i]
+            else:
+                update[i].span[i] -= 1
+        while self._level > 1 and self._head.next[self._level - 1] is None:
+            self._level -= 1
+        self._size -= 1
+
+
+class WindowLeaderboard(RankedLeaderboard):
+    """Board over the games stopped in the last ``days`` UTC days.
+
+    Loaded by rolling up player_stats_buckets and then kept current from
+    score events, like the all-time index. The window moves once a day:
+    a game from a later day, or a read after midnight, loads it again.
+    """
+
+    def __init__(self, days: int):
+        self.days = days
+        self._recorded = 0
+        self._lock = asyncio.Lock()
+        super().__init__()
+
+    def reset(self):
+        super().reset()
+        self.first_day = None
+        self.last_day = None
+        self._sums = {}
+
+    def current(self, day: date = None) -> bool:
+        return self.ready and self.last_day == (day or datetime.utcnow().date())
+
+    async def warm(self, db: AsyncSession, day: date = None):
+        day = day or datetime.utcnow().date()
+        first_day = day - timedelta(days=self.days - 1)
+        for _ in range(WARM_ATTEMPTS):
+            recorded = self._recorded
+            rows = (await db.execute(window_totals(first_day))).all()
+            # A game recorded meanwhile may be missing from the rows; read again
+            if self._recorded == recorded:
+                break
+        else:
+            # Games keep arriving: serve the window from SQL until a later read loads it
+            self.reset()
+            self.first_day = first_day
+            self.last_day = day
+            return
+        self.load(
+            LeaderboardEntry(row.user_id, row.username, row.games_played, row.deviation_sum / row.games_played, row.best_deviation)
+            for row in rows
+        )
+        self._sums = {row.user_id: row.deviation_sum for row in rows}
+        self.first_day = first_day
+        self.last_day = day
+
+    async def ensure_current(self, db: AsyncSession):
+        if self.current():
+            return
+        async with self._lock:
+            if not self.current():
+                await self.warm(db)
+
+    def record(self, user_id: int, username: str, deviation: float, day: date):
+        """Fold one stopped game in, as record_bucket did in the database."""
+        self._recorded += 1
+        if not self.ready:
+            return
+        if deviation is None or day is None or day > self.last_day:
+            # Past the window's last day: reload on the next read
+            self.ready = False
+            return
+        if day < self.first_day:
+            return
+        entry = self.get(user_id)
+        games = 1 if entry is None else entry.games_played + 1
+        total = self._sums.get(user_id, 0.0) + deviation
+        best = deviation if entry is None else min(entry.best_deviation, deviation)
+        self._sums[user_id] = total
+        self.upsert(LeaderboardEntry(user_id, username, games, total / games, best))
+
+
+leaderboard_index = RankedLeaderboard()
+
+# Boards selectable with ?window=; "all" is the all-time index
+WINDOW_DAYS = {"daily": 1, "weekly": 7}
+window_boards = {window: WindowLeaderboard(days) for window, days in WINDOW_DAYS.items()}
+WINDOWS = ("all", *WINDOW_DAYS)
+
+
+def board_for(window: str) -> RankedLeaderboard:
+    return leaderboard_index if window == "all" else window_boards[window]
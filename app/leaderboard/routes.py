@@ -1,48 +1,145 @@
-from fastapi import APIRouter, Depends, Query
-from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import func, select
-from app.database import get_db
-from app.models import User, GameSession
-
-router = APIRouter()
-
-@router.get("/")
-async def get_leaderboard(db: AsyncSession = Depends(get_db), skip: int = 0, limit: int = 10):
-    subquery = (
-        select(
-            GameSession.user_id,
-            func.count(GameSession.id).label("total_games"),
-            func.avg(GameSession.deviation).label("avg_deviation"),
-            func.min(GameSession.deviation).label("best_deviation")
-        )
-        .where(GameSession.status == "stopped") 
-        .group_by(GameSession.user_id)
-        .subquery()
-    )
-
-    query = (
-        select(
-            User.username,
-            subquery.c.total_games,
-            subquery.c.avg_deviation,
-            subquery.c.best_deviation
-        )
-        .join(subquery, User.id == subquery.c.user_id)
-        .order_by(subquery.c.avg_deviation.asc())
-        .offset(skip)
-        .limit(limit)
-    )
-
-    result = await db.execute(query)
-    rows = result.all()
-
-    return [
-        {
-            "username": r.username,
-            "total_games": r.total_games,
-            "average_deviation": round(r.avg_deviation, 2),
-            "best_deviation": round(r.best_deviation, 2)
-        }
-        for r in rows
-    ]
-
+import base64
+from typing import Annotated, Literal, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import get_db
+from app.auth.auth_dependencies import get_current_user
+from app.leaderboard.stats import leaderboard_query, window_leaderboard_query, player_rank
+from app.leaderboard.ranking import window_boards, board_for
+from app.leaderboard.cache import Page, leaderboard_pages
+
+router = APIRouter()
+
+@router.get("/")
+async def get_leaderboard(
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+    skip: int = Query(0, ge=0),
+    limit: int = Query(10, ge=1, le=100),
+    window: Literal["all", "daily", "weekly"] = "all",
+    cursor: Annotated[Optional[str], Query(description="X-Next-Cursor from the previous page; replaces skip")] = None
+):
+    return await serve_leaderboard(request, db, "leaderboard", leaderboard_row, skip, limit, window, cursor)
+
+
+async def serve_leaderboard(request: Request, db: AsyncSession, name: str, format_row, skip: int, limit: int, window: str = "all", cursor: str = None):
+    """One leaderboard page as a cached, pre-serialized response.
+
+    Pages start at ``skip`` or, given a cursor, right after the row it
+    names; either way the next page's cursor is sent as X-Next-Cursor.
+    """
+    after = decode_rank_cursor(cursor) if cursor else None
+    board = board_for(window)
+    if window in window_boards:
+        await board.ensure_current(db)
+    # Served from the cache while the in-memory board is unchanged
+    key = (name, window, after if after else skip, limit)
+    version = board.version
+    page = leaderboard_pages.get(key, version) if board.ready else None
+    if page is None:
+        # One row past the page tells whether there is a next one
+        rows = await leaderboard_entries(db, skip, limit + 1, window, after)
+        headers = {"X-Next-Cursor": encode_rank_cursor(rows[limit - 1])} if 0 < limit < len(rows) else None
+        page = Page([format_row(r) for r in rows[:max(limit, 0)]], headers)
+        if board.ready:
+            leaderboard_pages.set(key, version, page)
+    return page.response(request)
+
+
+def encode_rank_cursor(row):
+    raw = f"{row.avg_deviation!r}|{row.user_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_rank_cursor(cursor: str):
+    try:
+        avg_deviation, user_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return float(avg_deviation), int(user_id)
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+async def leaderboard_entries(db: AsyncSession, skip: int = 0, limit: int = 10, window: str = "all", after: tuple = None):
+    """Rows with username, games_played, avg_deviation, best_deviation and
+    user_id, in board order, from ``skip`` or after the ``after`` key."""
+    board = board_for(window)
+    if window in window_boards:
+        await board.ensure_current(db)
+    if board.ready:
+        return board.page_after(after, limit) if after else board.page(skip, limit)
+    if window in window_boards:
+        query = window_leaderboard_query(board.first_day, skip=0 if after else skip, limit=limit, after=after)
+    else:
+        query = leaderboard_query(skip=0 if after else skip, limit=limit, after=after)
+    result = await db.execute(query)
+    return result.all()
+
+
+async def leaderboard_rows(db: AsyncSession, skip: int = 0, limit: int = 10, window: str = "all"):
+    return [leaderboard_row(r) for r in await leaderboard_entries(db, skip, limit, window)]
+
+
+def leaderboard_row(r):
+    return {
+        "username": r.username,
+        "total_games": r.games_played,
+        "average_deviation": round(r.avg_deviation, 2),
+        "best_deviation": round(r.best_deviation, 2)
+    }
+
+
+@router.get("/me")
+async def get_my_rank(
+    db: AsyncSession = Depends(get_db),
+    current_user=Depends(get_current_user),
+    k: int = Query(5, ge=0, le=50),
+    window: Literal["all", "daily", "weekly"] = "all"
+):
+    return await rank_around(db, current_user.id, k, window)
+
+
+@router.get("/user/{user_id}")
+async def get_user_rank(
+    user_id: int,
+    db: AsyncSession = Depends(get_db),
+    k: int = Query(5, ge=0, le=50),
+    window: Literal["all", "daily", "weekly"] = "all"
+):
+    return await rank_around(db, user_id, k, window)
+
+
+async def rank_around(db: AsyncSession, user_id: int, k: int, window: str):
+    """A player's rank and percentile, with the ``k`` players either side.
+
+    Read from the in-memory index in O(log n + k). Before it is warm the
+    all-time rank is counted on the (avg_deviation, user_id) index.
+    """
+    board = board_for(window)
+    if window in window_boards:
+        await board.ensure_current(db)
+    if board.ready:
+        rank = board.rank_of(user_id)
+        players = len(board)
+    elif window == "all":
+        rank, players = await player_rank(db, user_id)
+    else:
+        rank = None
+    if not rank:
+        raise HTTPException(status_code=404, detail="Player has no ranked games")
+
+    # Fewer rows above a player near the top, never more below
+    first = max(1, rank - k)
+    limit = rank + k - first + 1
+    if board.ready:
+        neighbours = board.page(first - 1, limit)
+    else:
+        result = await db.execute(leaderboard_query(skip=first - 1, limit=limit))
+        neighbours = result.all()
+    rows = [{"rank": first + i, **leaderboard_row(r)} for i, r in enumerate(neighbours)]
+    return {
+        **rows[rank - first],
+        # Share of ranked players placed below this one
+        "percentile": round(100 * (players - rank) / players, 2),
+        "players": players,
+        "neighbours": rows
+    }
@@ -0,0 +1,206 @@
+from datetime import date, datetime, timedelta
+from sqlalchemy import Date, and_, case, cast, delete, func, insert, or_, select, tuple_, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models import User, GameSession, PlayerStats, PlayerStatsBucket
+
+
+def leaderboard_query(skip: int = 0, limit: int = None, after: tuple = None):
+    """The board in (avg_deviation, user_id) order, from ``skip`` or, for
+    keyset paging, after the ``after`` key; both walk the index."""
+    query = (
+        select(
+            User.username,
+            PlayerStats.games_played,
+            PlayerStats.avg_deviation,
+            PlayerStats.best_deviation,
+            PlayerStats.user_id
+        )
+        .join(PlayerStats, User.id == PlayerStats.user_id)
+        .order_by(PlayerStats.avg_deviation.asc(), PlayerStats.user_id.asc())
+        .offset(skip)
+    )
+    if after is not None:
+        query = query.where(tuple_(PlayerStats.avg_deviation, PlayerStats.user_id) > tuple_(*after))
+    if limit is not None:
+        query = query.limit(limit)
+    return query
+
+
+async def player_rank(db: AsyncSession, user_id: int):
+    """(rank, players) on the all-time board, rank None if unranked.
+
+    Counts the rows ahead in (avg_deviation, user_id) order, an index-only
+    range scan on ix_player_stats_avg_deviation_user_id.
+    """
+    avg_deviation = await db.scalar(select(PlayerStats.avg_deviation).where(PlayerStats.user_id == user_id))
+    players = await db.scalar(select(func.count()).select_from(PlayerStats))
+    if avg_deviation is None:
+        return None, players
+    ahead = await db.scalar(
+        select(func.count())
+        .select_from(PlayerStats)
+        .where(or_(
+            PlayerStats.avg_deviation < avg_deviation,
+            and_(PlayerStats.avg_deviation == avg_deviation, PlayerStats.user_id < user_id)
+        ))
+    )
+    return ahead + 1, players
+
+
+def window_totals(first_day: date):
+    """Per-player sums over the buckets from ``first_day`` on, unordered."""
+    return (
+        select(
+            PlayerStatsBucket.user_id,
+            User.username,
+            func.sum(PlayerStatsBucket.games_played).label("games_played"),
+            func.sum(PlayerStatsBucket.deviation_sum).label("deviation_sum"),
+            func.min(PlayerStatsBucket.best_deviation).label("best_deviation")
+        )
+        .join(User, User.id == PlayerStatsBucket.user_id)
+        .where(PlayerStatsBucket.day >= first_day)
+        .group_by(PlayerStatsBucket.user_id, User.username)
+    )
+
+
+def window_leaderboard_query(first_day: date, skip: int = 0, limit: int = None, after: tuple = None):
+    """leaderboard_query over the games stopped since ``first_day``."""
+    totals = window_totals(first_day).subquery()
+    avg_deviation = (totals.c.deviation_sum / totals.c.games_played).label("avg_deviation")
+    query = (
+        select(totals.c.username, totals.c.games_played, avg_deviation, totals.c.best_deviation, totals.c.user_id)
+        .order_by(avg_deviation.asc(), totals.c.user_id.asc())
+        .offset(skip)
+    )
+    if after is not None:
+        query = query.where(tuple_(totals.c.deviation_sum / totals.c.games_played, totals.c.user_id) > tuple_(*after))
+    if limit is not None:
+        query = query.limit(limit)
+    return query
+
+
+async def record_game_result(db: AsyncSession, user_id: int, deviation: float, played_at):
+    """Fold one stopped game into the player's aggregate row.
+
+    Runs inside the caller's transaction so the session and the stats
+    are committed together. Returns the updated row.
+    """
+    result = await db.execute(
+        update(PlayerStats)
+        .where(PlayerStats.user_id == user_id)
+        .values(
+            games_played=PlayerStats.games_played + 1,
+            deviation_sum=PlayerStats.deviation_sum + deviation,
+            avg_deviation=(PlayerStats.deviation_sum + deviation) / (PlayerStats.games_played + 1),
+            best_deviation=case(
+                (PlayerStats.best_deviation <= deviation, PlayerStats.best_deviation),
+                else_=deviation
+            ),
+            last_played=played_at
+        )
+        .returning(
+            PlayerStats.user_id,
+            PlayerStats.games_played,
+            PlayerStats.avg_deviation,
+            PlayerStats.best_deviation
+        )
+        .execution_options(synchronize_session=False)
+    )
+    stats = result.first()
+    if stats is None:
+        stats = PlayerStats(
+            user_id=user_id,
+            games_played=1,
+            deviation_sum=deviation,
+            avg_deviation=deviation,
+            best_deviation=deviation,
+            last_played=played_at
+        )
+        db.add(stats)
+    await record_bucket(db, user_id, deviation, played_at)
+    return stats
+
+
+async def record_bucket(db: AsyncSession, user_id: int, deviation: float, played_at):
+    """Add one game to the player's bucket for the day it was played."""
+    day = played_at.date()
+    result = await db.execute(
+        update(PlayerStatsBucket)
+        .where(PlayerStatsBucket.user_id == user_id, PlayerStatsBucket.day == day)
+        .values(
+            games_played=PlayerStatsBucket.games_played + 1,
+            deviation_sum=PlayerStatsBucket.deviation_sum + deviation,
+            best_deviation=case(
+                (PlayerStatsBucket.best_deviation <= deviation, PlayerStatsBucket.best_deviation),
+                else_=deviation
+            )
+        )
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount == 0:
+        db.add(PlayerStatsBucket(
+            user_id=user_id,
+            day=day,
+            games_played=1,
+            deviation_sum=deviation,
+            best_deviation=deviation
+        ))
+
+
+async def rebuild_player_stats(db: AsyncSession):
+    """Recompute every PlayerStats row from game_sessions."""
+    aggregate = (
+        select(
+            GameSession.user_id,
+            func.count(),
+            func.sum(GameSession.deviation),
+            func.avg(GameSession.deviation),
+            func.min(GameSession.deviation),
+            func.max(GameSession.stop_time)
+        )
+        .where(GameSession.status == "stopped")
+        .group_by(GameSession.user_id)
+    )
+    await db.execute(delete(PlayerStats))
+    await db.execute(
+        insert(PlayerStats).from_select(
+            ["user_id", "games_played", "deviation_sum", "avg_deviation", "best_deviation", "last_played"],
+            aggregate
+        )
+    )
+    await db.commit()
+    return await db.scalar(select(func.count()).select_from(PlayerStats))
+
+
+def stop_day(db: AsyncSession):
+    """GameSession.stop_time truncated to its UTC day, per dialect."""
+    # SQLite keeps dates as 'YYYY-MM-DD' text, which is what date() returns
+    if db.bind.dialect.name == "sqlite":
+        return func.date(GameSession.stop_time)
+    return cast(GameSession.stop_time, Date)
+
+
+async def rebuild_stats_buckets(db: AsyncSession, days: int):
+    """Recompute the last ``days`` days of buckets from game_sessions."""
+    first_day = datetime.utcnow().date() - timedelta(days=days - 1)
+    day = stop_day(db)
+    aggregate = (
+        select(
+            GameSession.user_id,
+            day,
+            func.count(),
+            func.sum(GameSession.deviation),
+            func.min(GameSession.deviation)
+        )
+        .where(GameSession.status == "stopped", GameSession.stop_time >= datetime.combine(first_day, datetime.min.time()))
+        .group_by(GameSession.user_id, day)
+    )
+    await db.execute(delete(PlayerStatsBucket))
+    await db.execute(
+        insert(PlayerStatsBucket).from_select(
+            ["user_id", "day", "games_played", "deviation_sum", "best_deviation"],
+            aggregate
+        )
+    )
+    await db.commit()
+    return await db.scalar(select(func.count()).select_from(PlayerStatsBucket))
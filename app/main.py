@@ -1,38 +1,88 @@
-from fastapi import FastAPI, WebSocket, Depends
-from fastapi.middleware.cors import CORSMiddleware
-from app.database import Base, engine
-from app.auth.routes import router as auth_router
-from app.games.routes import router as games_router
-from app.leaderboard.routes import router as leaderboard_router
-from app.analytics.routes import router as analytics_router
-from sqlalchemy.ext.asyncio import AsyncSession
-
-from app.database import get_db
-from app.websockets.leaderboard import leaderboard_websocket_endpoint
-
-app = FastAPI(title="Time It Right 🎯")
-
-# CORS
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-
-@app.on_event("startup")
-async def startup():
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
-
-# Incluir rutas
-app.include_router(auth_router, prefix="/auth", tags=["Auth"])
-app.include_router(games_router, prefix="/games", tags=["Games"])
-app.include_router(leaderboard_router, prefix="/leaderboard", tags=["Leaderboard"])
-app.include_router(analytics_router, prefix="/analytics", tags=["Analytics"])
-
-#ws
-@app.websocket("/ws/leaderboard")
-async def ws_leaderboard(websocket: WebSocket, db: AsyncSession = Depends(get_db)):
-    await leaderboard_websocket_endpoint(websocket, db)
+from fastapi import FastAPI, WebSocket, Response
+from fastapi.middleware.cors import CORSMiddleware
+from app.config import MIGRATE_ON_STARTUP, SWEEP_ENABLED, SESSION_WRITE_BEHIND, METRICS_ENABLED, SLOW_QUERY_LOG
+from app.database import engine, SessionLocal
+from app.auth.routes import router as auth_router
+from app.games.routes import router as games_router
+from app.leaderboard.routes import router as leaderboard_router
+from app.analytics.routes import router as analytics_router
+from app.admin.routes import router as admin_router
+from app.websockets.leaderboard import leaderboard_websocket_endpoint, publishers
+from app.leaderboard.ranking import leaderboard_index, window_boards
+from app.leaderboard.cache import leaderboard_pages
+from app.pubsub import pubsub
+from app.auth.utils import password_hasher
+from app.games.sweeper import sweeper
+from app.games.registry import active_sessions
+from app.games.writer import session_writer
+from app.metrics import CONTENT_TYPE, MetricsMiddleware, registry
+from app.slow_queries import RequestScopeMiddleware
+
+app = FastAPI(title="Time It Right 🎯")
+
+# CORS
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+if SLOW_QUERY_LOG:
+    app.add_middleware(RequestScopeMiddleware)
+
+@app.on_event("startup")
+async def startup():
+    # Schema changes are applied by `python -m app.migrations upgrade`, once per deploy
+    from app.migrations import runner
+    if MIGRATE_ON_STARTUP:
+        await runner.upgrade(engine)
+    await runner.verify(engine)
+    # Listen before warming so no score event falls between the two
+    await pubsub.start()
+    async with SessionLocal() as db:
+        await leaderboard_index.warm(db)
+        for board in window_boards.values():
+            await board.warm(db)
+        await active_sessions.load(db)
+    for publisher in publishers.values():
+        publisher.start()
+    if SESSION_WRITE_BEHIND:
+        session_writer.start()
+    if SWEEP_ENABLED:
+        sweeper.start()
+
+@app.on_event("shutdown")
+async def shutdown():
+    await sweeper.stop()
+    # Queued writes still publish their scores
+    await session_writer.stop()
+    for publisher in publishers.values():
+        await publisher.stop()
+    await pubsub.stop()
+    password_hasher.shutdown()
+    leaderboard_index.reset()
+    for board in window_boards.values():
+        board.reset()
+    leaderboard_pages.clear()
+    active_sessions.clear()
+    await engine.dispose()
+
+# Incluir rutas
+app.include_router(auth_router, prefix="/auth", tags=["Auth"])
+app.include_router(games_router, prefix="/games", tags=["Games"])
+app.include_router(leaderboard_router, prefix="/leaderboard", tags=["Leaderboard"])
+app.include_router(analytics_router, prefix="/analytics", tags=["Analytics"])
+app.include_router(admin_router, prefix="/admin", tags=["Admin"])
+
+if METRICS_ENABLED:
+    @app.get("/metrics", include_in_schema=False)
+    async def metrics():
+        return Response(registry.render(), media_type=CONTENT_TYPE)
+
+#ws
+@app.websocket("/ws/leaderboard")
+async def ws_leaderboard(websocket: WebSocket):
+    await leaderboard_websocket_endpoint(websocket)
@@ -0,0 +1,26 @@
+"""Apply or inspect schema migrations.
+
+Usage:
+    python -m app.migrations upgrade [--to N]
+    python -m app.migrations current
+"""
+import argparse
+import asyncio
+from app.database import engine
+from app.migrations.runner import current_revision, head_revision, upgrade
+
+
+async def main(args):
+    if args.command == "upgrade":
+        applied = await upgrade(engine, args.to)
+        for module in applied:
+            print(f"applied {module.revision}: {module.description}")
+    print(f"schema at revision {await current_revision(engine)} (head {head_revision()})")
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["upgrade", "current"])
+    parser.add_argument("--to", type=int, help="stop at this revision instead of the latest")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,110 @@
+import importlib
+import logging
+import pkgutil
+from datetime import datetime
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError, ProgrammingError
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+SCHEMA_VERSION_TABLE = "schema_version"
+VERSIONS_PACKAGE = "app.migrations.versions"
+# Serialises concurrent runners on Postgres (e.g. two deploys racing)
+ADVISORY_LOCK_ID = 7214_0001
+
+logger = logging.getLogger(__name__)
+
+
+def load_revisions():
+    """Revision modules in app/migrations/versions, ordered by number.
+
+    Each module defines ``revision`` (1, 2, ...), ``description`` and
+    ``async def upgrade(conn)``.
+    """
+    package = importlib.import_module(VERSIONS_PACKAGE)
+    revisions = [
+        importlib.import_module(f"{VERSIONS_PACKAGE}.{info.name}")
+        for info in pkgutil.iter_modules(package.__path__)
+    ]
+    revisions.sort(key=lambda module: module.revision)
+    numbers = [module.revision for module in revisions]
+    if numbers != list(range(1, len(numbers) + 1)):
+        raise RuntimeError(f"Migration revisions must be numbered 1..n without gaps, got {numbers}")
+    return revisions
+
+
+def head_revision():
+    revisions = load_revisions()
+    return revisions[-1].revision if revisions else 0
+
+
+async def _ensure_version_table(conn):
+    await conn.execute(text(
+        f"CREATE TABLE IF NOT EXISTS {SCHEMA_VERSION_TABLE} ("
+        "version INTEGER PRIMARY KEY, "
+        "description VARCHAR NOT NULL, "
+        "applied_at TIMESTAMP NOT NULL)"
+    ))
+
+
+async def _current(conn):
+    return await conn.scalar(text(f"SELECT MAX(version) FROM {SCHEMA_VERSION_TABLE}")) or 0
+
+
+async def current_revision(engine: AsyncEngine):
+    """Applied schema version, 0 for a database that was never migrated.
+
+    A single query, without inspecting the catalog, since every worker
+    runs it at boot.
+    """
+    async with engine.connect() as conn:
+        try:
+            return await _current(conn)
+        except (OperationalError, ProgrammingError):
+            # No schema_version table yet
+            return 0
+
+
+async def verify(engine: AsyncEngine):
+    """Fail fast when the database is behind the revision this code expects.
+
+    A database that is ahead only gets a warning: during a rolling deploy
+    the new build may already have migrated it while old workers still run.
+    """
+    current, head = await current_revision(engine), head_revision()
+    if current < head:
+        raise RuntimeError(
+            f"Database schema is at revision {current}, this build expects {head}; "
+            "run `python -m app.migrations upgrade`"
+        )
+    if current > head:
+        logger.warning("Database schema is at revision %s, ahead of this build's %s", current, head)
+    return current
+
+
+async def upgrade(engine: AsyncEngine, target: int = None):
+    """Apply every pending revision up to ``target`` (default: head).
+
+    Each revision runs in its own transaction together with its
+    schema_version row, so a failed revision leaves the previous one in
+    place. Returns the revisions applied.
+    """
+    applied = []
+    for module in load_revisions():
+        if target is not None and module.revision > target:
+            break
+        async with engine.begin() as conn:
+            if conn.dialect.name == "postgresql":
+                await conn.execute(text("SELECT pg_advisory_xact_lock(:id)"), {"id": ADVISORY_LOCK_ID})
+            await _ensure_version_table(conn)
+            if await _current(conn) >= module.revision:
+                continue
+            await module.upgrade(conn)
+            await conn.execute(
+                text(
+                    f"INSERT INTO {SCHEMA_VERSION_TABLE} (version, description, applied_at) "
+                    "VALUES (:version, :description, :applied_at)"
+                ),
+                {"version": module.revision, "description": module.description, "applied_at": datetime.utcnow()}
+            )
+        applied.append(module)
+    return applied
@@ -0,0 +1,56 @@
+"""Tables as they were before migrations existed.
+
+Defined here rather than taken from app.models so later revisions can
+change the models without changing what this one creates. Databases
+that create_all already built are left as they are.
+"""
+from sqlalchemy import Column, DateTime, Float, ForeignKey, Index, Integer, MetaData, String, Table, Text
+
+revision = 1
+description = "Baseline schema"
+
+metadata = MetaData()
+
+Table(
+    "users", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("username", String, unique=True, index=True),
+    Column("email", String, unique=True, index=True),
+    Column("hashed_password", String),
+    Column("created_at", DateTime),
+)
+
+Table(
+    "game_sessions", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("user_id", Integer, ForeignKey("users.id")),
+    Column("start_time", DateTime),
+    Column("stop_time", DateTime, nullable=True),
+    Column("duration", Float, nullable=True),
+    Column("deviation", Float, nullable=True),
+    Column("status", String),
+    Column("created_at", DateTime),
+    Index("ix_game_sessions_user_id_created_at", "user_id", "created_at"),
+)
+
+Table(
+    "player_stats", metadata,
+    Column("user_id", Integer, ForeignKey("users.id"), primary_key=True),
+    Column("games_played", Integer, nullable=False),
+    Column("deviation_sum", Float, nullable=False),
+    Column("avg_deviation", Float, nullable=False),
+    Column("best_deviation", Float, nullable=False),
+    Column("last_played", DateTime),
+    Index("ix_player_stats_avg_deviation_user_id", "avg_deviation", "user_id"),
+)
+
+Table(
+    "player_sketches", metadata,
+    Column("user_id", Integer, ForeignKey("users.id"), primary_key=True),
+    Column("data", Text, nullable=False),
+    Column("updated_at", DateTime),
+)
+
+
+async def upgrade(conn):
+    await conn.run_sync(metadata.create_all)
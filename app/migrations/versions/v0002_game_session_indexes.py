@@ -0,0 +1,39 @@
+"""Indexes for the game hot paths and one started session per user.
+
+- (user_id, status, deviation, stop_time) serves the active-session
+  lookup and covers the per-user aggregates and the player_stats
+  rebuild, so they never touch the table. It is not partial on
+  status = 'stopped' because the app binds status as a parameter, and
+  a partial index is only used when the planner sees the literal.
+- A partial unique index on user_id over started sessions makes the
+  database reject a second running game, instead of start_game checking
+  first and racing.
+
+Also creates the indexes from before migrations on databases built
+without them. The statements are valid on both SQLite and Postgres.
+"""
+from sqlalchemy import text
+
+revision = 2
+description = "Game session indexes and one started session per user"
+
+
+async def upgrade(conn):
+    # Older databases may hold several started sessions for a player;
+    # keep the newest so the unique index can be built
+    await conn.execute(text(
+        "UPDATE game_sessions SET status = 'expired' "
+        "WHERE status = 'started' AND id NOT IN ("
+        "SELECT MAX(id) FROM game_sessions WHERE status = 'started' GROUP BY user_id)"
+    ))
+    for statement in (
+        "CREATE INDEX IF NOT EXISTS ix_game_sessions_user_id_created_at "
+        "ON game_sessions (user_id, created_at)",
+        "CREATE INDEX IF NOT EXISTS ix_player_stats_avg_deviation_user_id "
+        "ON player_stats (avg_deviation, user_id)",
+        "CREATE INDEX IF NOT EXISTS ix_game_sessions_user_id_status "
+        "ON game_sessions (user_id, status, deviation, stop_time)",
+        "CREATE UNIQUE INDEX IF NOT EXISTS uq_game_sessions_user_id_started "
+        "ON game_sessions (user_id) WHERE status = 'started'",
+    ):
+        await conn.execute(text(statement))
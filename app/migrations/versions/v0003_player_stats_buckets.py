@@ -0,0 +1,61 @@
+"""Per-player, per-day aggregates behind the daily and weekly leaderboards.
+
+The table is defined here, like the baseline, so later model changes do
+not change what this revision creates. It is filled from the last week
+of game_sessions, the widest window served; older days would only be
+compacted away again.
+"""
+from datetime import datetime, timedelta
+from sqlalchemy import Column, Date, DateTime, Float, ForeignKey, Index, Integer, MetaData, Table, cast, func, insert, select
+from sqlalchemy.sql import column, table
+
+revision = 3
+description = "Player stats buckets for windowed leaderboards"
+
+BACKFILL_DAYS = 7
+
+metadata = MetaData()
+
+# Only so the foreign key resolves; the table itself already exists
+Table("users", metadata, Column("id", Integer, primary_key=True))
+
+player_stats_buckets = Table(
+    "player_stats_buckets", metadata,
+    Column("user_id", Integer, ForeignKey("users.id"), primary_key=True),
+    Column("day", Date, primary_key=True),
+    Column("games_played", Integer, nullable=False),
+    Column("deviation_sum", Float, nullable=False),
+    Column("best_deviation", Float, nullable=False),
+    Index("ix_player_stats_buckets_day", "day"),
+)
+
+game_sessions = table(
+    "game_sessions",
+    column("user_id"), column("stop_time", DateTime), column("deviation"), column("status"),
+)
+
+
+async def upgrade(conn):
+    await conn.run_sync(lambda sync_conn: player_stats_buckets.create(sync_conn, checkfirst=True))
+    if await conn.scalar(select(func.count()).select_from(player_stats_buckets)):
+        return
+    # SQLite keeps dates as 'YYYY-MM-DD' text, which is what date() returns
+    if conn.dialect.name == "sqlite":
+        day = func.date(game_sessions.c.stop_time)
+    else:
+        day = cast(game_sessions.c.stop_time, Date)
+    since = datetime.combine(datetime.utcnow().date() - timedelta(days=BACKFILL_DAYS - 1), datetime.min.time())
+    await conn.execute(
+        insert(player_stats_buckets).from_select(
+            ["user_id", "day", "games_played", "deviation_sum", "best_deviation"],
+            select(
+                game_sessions.c.user_id,
+                day,
+                func.count(),
+                func.sum(game_sessions.c.deviation),
+                func.min(game_sessions.c.deviation)
+            )
+            .where(game_sessions.c.status == "stopped", game_sessions.c.stop_time >= since)
+            .group_by(game_sessions.c.user_id, day)
+        )
+    )
@@ -1,25 +1,76 @@
-from sqlalchemy import Column, Integer, String, DateTime, Float, ForeignKey
-from sqlalchemy.orm import relationship
-from datetime import datetime
-from .database import Base
-
-class User(Base):
-    __tablename__ = "users"
-    id = Column(Integer, primary_key=True)
-    username = Column(String, unique=True, index=True)
-    email = Column(String, unique=True, index=True)
-    hashed_password = Column(String)
-    created_at = Column(DateTime, default=datetime.utcnow)
-    sessions = relationship("GameSession", back_populates="user")
-
-class GameSession(Base):
-    __tablename__ = "game_sessions"
-    id = Column(Integer, primary_key=True)
-    user_id = Column(Integer, ForeignKey("users.id"))
-    start_time = Column(DateTime)
-    stop_time = Column(DateTime, nullable=True)
-    duration = Column(Float, nullable=True)
-    deviation = Column(Float, nullable=True)
-    status = Column(String, default="started")
-    created_at = Column(DateTime, default=datetime.utcnow)
-    user = relationship("User", back_populates="sessions")
+from sqlalchemy import Column, Integer, String, Date, DateTime, Float, ForeignKey, Index, Text, text
+from sqlalchemy.orm import relationship
+from datetime import datetime
+from .database import Base
+
+class User(Base):
+    __tablename__ = "users"
+    id = Column(Integer, primary_key=True)
+    username = Column(String, unique=True, index=True)
+    email = Column(String, unique=True, index=True)
+    hashed_password = Column(String)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    sessions = relationship("GameSession", back_populates="user")
+    stats = relationship("PlayerStats", back_populates="user", uselist=False)
+
+class GameSession(Base):
+    __tablename__ = "game_sessions"
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"))
+    start_time = Column(DateTime)
+    stop_time = Column(DateTime, nullable=True)
+    duration = Column(Float, nullable=True)
+    deviation = Column(Float, nullable=True)
+    status = Column(String, default="started")
+    created_at = Column(DateTime, default=datetime.utcnow)
+    user = relationship("User", back_populates="sessions")
+
+    # Kept in step with app/migrations/versions
+    __table_args__ = (
+        Index("ix_game_sessions_user_id_created_at", "user_id", "created_at"),
+        # Covers the active-session lookup and the stopped-session aggregates
+        Index("ix_game_sessions_user_id_status", "user_id", "status", "deviation", "stop_time"),
+        # At most one running game per player
+        Index(
+            "uq_game_sessions_user_id_started", "user_id",
+            unique=True,
+            sqlite_where=text("status = 'started'"),
+            postgresql_where=text("status = 'started'")
+        ),
+    )
+
+class PlayerStats(Base):
+    __tablename__ = "player_stats"
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    games_played = Column(Integer, nullable=False, default=0)
+    deviation_sum = Column(Float, nullable=False, default=0.0)
+    avg_deviation = Column(Float, nullable=False)
+    best_deviation = Column(Float, nullable=False)
+    last_played = Column(DateTime)
+    user = relationship("User", back_populates="stats")
+
+    # Leaderboard reads are a top-N walk over this index, ties broken by user id
+    __table_args__ = (
+        Index("ix_player_stats_avg_deviation_user_id", "avg_deviation", "user_id"),
+    )
+
+class PlayerSketch(Base):
+    __tablename__ = "player_sketches"
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    # Serialized QuantileSketch over the player's deviations
+    data = Column(Text, nullable=False)
+    updated_at = Column(DateTime)
+
+class PlayerStatsBucket(Base):
+    """A player's games stopped on one UTC day; windowed boards sum these."""
+    __tablename__ = "player_stats_buckets"
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    day = Column(Date, primary_key=True)
+    games_played = Column(Integer, nullable=False, default=0)
+    deviation_sum = Column(Float, nullable=False, default=0.0)
+    best_deviation = Column(Float, nullable=False)
+
+    # Window reads and compaction are range scans on day
+    __table_args__ = (
+        Index("ix_player_stats_buckets_day", "day"),
+    )
@@ -0,0 +1,149 @@
+import abc
+import asyncio
+import json
+import logging
+from collections import defaultdict
+from app.config import PUBSUB_BACKEND, DATABASE_URL
+
+RECONNECT_DELAY_SECONDS = 1
+MAX_RECONNECT_DELAY_SECONDS = 30
+
+logger = logging.getLogger(__name__)
+
+
+class PubSub(abc.ABC):
+    """Publish/subscribe for events every worker has to see.
+
+    Handlers take the decoded payload and may be plain functions or
+    coroutines. Resync callbacks run when a backend may have missed events
+    (e.g. after reconnecting) so subscribers can reload their state.
+    """
+
+    def __init__(self):
+        self._handlers = defaultdict(list)
+        self._resync = []
+
+    def subscribe(self, channel: str, handler):
+        self._handlers[channel].append(handler)
+
+    def on_resync(self, callback):
+        self._resync.append(callback)
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    @abc.abstractmethod
+    async def publish(self, channel: str, payload: dict):
+        """Deliver ``payload`` to the ``channel`` subscribers of every worker."""
+
+    async def _dispatch(self, channel: str, payload: dict):
+        for handler in self._handlers.get(channel, ()):
+            try:
+                result = handler(payload)
+                if asyncio.iscoroutine(result):
+                    await result
+            except Exception:
+                logger.exception("Handler for %s failed", channel)
+
+    async def _run_resync(self):
+        for callback in self._resync:
+            try:
+                result = callback()
+                if asyncio.iscoroutine(result):
+                    await result
+            except Exception:
+                logger.exception("Resync callback failed")
+
+
+class InProcessPubSub(PubSub):
+    """Delivers events to subscribers in this process only."""
+
+    async def publish(self, channel: str, payload: dict):
+        await self._dispatch(channel, payload)
+
+
+class PostgresPubSub(PubSub):
+    """Fans events out to every process connected to the same database
+    through LISTEN/NOTIFY. Postgres delivers notifications in commit order
+    and also to the sending connection, so every node, including the
+    publisher, applies the same sequence of events."""
+
+    def __init__(self, dsn: str):
+        super().__init__()
+        self.dsn = dsn
+        self._conn = None
+        self._lock = asyncio.Lock()
+        self._reconnect_task = None
+        self._closing = False
+        self._tasks = set()
+
+    async def start(self):
+        self._closing = False
+        await self._connect()
+
+    async def stop(self):
+        self._closing = True
+        if self._reconnect_task is not None:
+            self._reconnect_task.cancel()
+            self._reconnect_task = None
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            await conn.close()
+
+    async def publish(self, channel: str, payload: dict):
+        async with self._lock:
+            if self._conn is None:
+                raise ConnectionError("Pub/sub connection is not available")
+            await self._conn.execute("SELECT pg_notify($1, $2)", channel, json.dumps(payload))
+
+    async def _connect(self):
+        import asyncpg
+
+        conn = await asyncpg.connect(self.dsn)
+        for channel in self._handlers:
+            await conn.add_listener(channel, self._on_notify)
+        conn.add_termination_listener(self._on_terminated)
+        self._conn = conn
+
+    def _on_notify(self, conn, pid, channel, payload):
+        self._spawn(self._dispatch(channel, json.loads(payload)))
+
+    def _on_terminated(self, conn):
+        if self._closing or conn is not self._conn:
+            return
+        logger.warning("Pub/sub connection lost, reconnecting")
+        self._conn = None
+        self._reconnect_task = asyncio.create_task(self._reconnect())
+
+    async def _reconnect(self):
+        delay = RECONNECT_DELAY_SECONDS
+        while not self._closing:
+            try:
+                await self._connect()
+            except Exception:
+                logger.exception("Pub/sub reconnect failed")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, MAX_RECONNECT_DELAY_SECONDS)
+                continue
+            await self._run_resync()
+            return
+
+    def _spawn(self, coroutine):
+        task = asyncio.create_task(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+
+def create_pubsub(backend: str = PUBSUB_BACKEND, database_url: str = DATABASE_URL):
+    if backend == "memory":
+        return InProcessPubSub()
+    if backend == "postgres":
+        # asyncpg wants a plain libpq URL, without the SQLAlchemy driver suffix
+        return PostgresPubSub(database_url.replace("postgresql+asyncpg://", "postgresql://", 1))
+    raise ValueError(f"Unknown PUBSUB_BACKEND: {backend}")
+
+
+pubsub = create_pubsub()
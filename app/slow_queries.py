@@ -0,0 +1,199 @@
+"""Statements slower than a threshold, kept in memory with where they came from.
+
+Only statements over SLOW_QUERY_MS are recorded, so the cost for the rest
+is one clock read before and after. The SQL is normalized (literals and
+placeholder lists collapsed) so one query shape reads as one entry
+however it was called; parameters are reduced to their types.
+"""
+import contextvars
+import logging
+import re
+import time
+from collections import deque
+from datetime import datetime
+from sqlalchemy import event
+from app.config import (
+    SLOW_QUERY_MS,
+    SLOW_QUERY_LOG_SIZE,
+    SLOW_QUERY_EXPLAIN,
+    SLOW_QUERY_EXPLAIN_ANALYZE,
+    SLOW_QUERY_EXPLAIN_INTERVAL_SECONDS,
+)
+
+MAX_SQL_LENGTH = 2000
+# Statement shapes remembered for the explain interval; past this they start over
+MAX_EXPLAINED_SHAPES = 1000
+
+logger = logging.getLogger(__name__)
+
+# ASGI scope of the request or WebSocket being served; the route is read
+# from it when a slow statement is recorded, after routing has matched
+request_scope = contextvars.ContextVar("request_scope", default=None)
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"(?<![\w$])-?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?\b")
+_PLACEHOLDER_LIST = re.compile(r"\(\s*(?:\?|\$\d+|%\(\w+\)s|:\w+)(?:\s*,\s*(?:\?|\$\d+|%\(\w+\)s|:\w+))*\s*\)")
+_REPEATED_LIST = re.compile(r"\(\.\.\.\)(?:\s*,\s*\(\.\.\.\))+")
+_SPACE = re.compile(r"\s+")
+
+
+def normalize_sql(statement: str) -> str:
+    """One line of SQL with literals as ``?`` and placeholder lists as ``(...)``."""
+    sql = _SPACE.sub(" ", statement).strip()
+    sql = _STRING.sub("?", sql)
+    sql = _NUMBER.sub("?", sql)
+    sql = _PLACEHOLDER_LIST.sub("(...)", sql)
+    sql = _REPEATED_LIST.sub("(...)", sql)
+    return sql[:MAX_SQL_LENGTH]
+
+
+def _type_name(value) -> str:
+    return "null" if value is None else type(value).__name__
+
+
+def params_shape(parameters, executemany: bool = False):
+    """The parameters' types without their values, e.g. ``["int", "str"]``."""
+    if executemany:
+        rows = list(parameters or ())
+        return {"rows": len(rows), "each": params_shape(rows[0]) if rows else None}
+    if parameters is None:
+        return None
+    if isinstance(parameters, dict):
+        return {key: _type_name(value) for key, value in parameters.items()}
+    return [_type_name(value) for value in parameters]
+
+
+def current_route():
+    scope = request_scope.get()
+    if scope is None:
+        return None
+    route = scope.get("route")
+    return route.path if route is not None else scope.get("path")
+
+
+class SlowQueryLog:
+    """A bounded ring of the latest slow statements.
+
+    An entry has the normalized SQL, the parameter types, the duration and
+    the route being served (None for background tasks). The first time a
+    statement shape turns up slow, and then at most once per
+    ``explain_interval`` seconds, its plan is captured too, on the same
+    connection: EXPLAIN QUERY PLAN on SQLite, EXPLAIN on Postgres, or
+    EXPLAIN (ANALYZE, BUFFERS) there for SELECTs when ``explain_analyze``
+    is set, which runs the query a second time.
+    """
+
+    def __init__(self, threshold_ms: float = SLOW_QUERY_MS, size: int = SLOW_QUERY_LOG_SIZE, explain: bool = SLOW_QUERY_EXPLAIN, explain_analyze: bool = SLOW_QUERY_EXPLAIN_ANALYZE, explain_interval: float = SLOW_QUERY_EXPLAIN_INTERVAL_SECONDS):
+        self.threshold_ms = threshold_ms
+        self.explain = explain
+        self.explain_analyze = explain_analyze
+        self.explain_interval = explain_interval
+        self.entries = deque(maxlen=size)
+        self.stats = {
+            "recorded": 0,
+            "explained": 0,
+            "explain_errors": 0,
+        }
+        self._explained_at = {}
+
+    def attach(self, engine):
+        """Listen to the cursor events of an (async) engine."""
+        sync_engine = getattr(engine, "sync_engine", engine)
+        event.listen(sync_engine, "before_cursor_execute", self._before_cursor_execute)
+        event.listen(sync_engine, "after_cursor_execute", self._after_cursor_execute)
+
+    def clear(self):
+        self.entries.clear()
+        self._explained_at.clear()
+
+    def snapshot(self, limit: int = None):
+        """Entries, newest first."""
+        entries = list(reversed(self.entries))
+        return entries[:limit] if limit is not None else entries
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        context._slow_query_started = time.perf_counter()
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        duration_ms = (time.perf_counter() - context._slow_query_started) * 1000
+        if duration_ms < self.threshold_ms:
+            return
+        sql = normalize_sql(statement)
+        entry = {
+            "at": datetime.utcnow().isoformat(),
+            "duration_ms": round(duration_ms, 3),
+            "sql": sql,
+            "params": params_shape(parameters, executemany),
+            "route": current_route(),
+            "plan": None,
+        }
+        # A streamed result still holds the connection, and executemany has no single plan
+        if self.explain and not executemany and not context.execution_options.get("stream_results") and self._due(sql):
+            entry["plan"] = self._explain(conn, statement, parameters)
+        self.entries.append(entry)
+        self.stats["recorded"] += 1
+
+    def _due(self, sql: str) -> bool:
+        now = time.monotonic()
+        last = self._explained_at.get(sql)
+        if last is not None and now - last < self.explain_interval:
+            return False
+        if len(self._explained_at) >= MAX_EXPLAINED_SHAPES:
+            self._explained_at.clear()
+        self._explained_at[sql] = now
+        return True
+
+    def _explain(self, conn, statement, parameters):
+        dialect = conn.dialect.name
+        if dialect == "sqlite":
+            prefix = "EXPLAIN QUERY PLAN "
+        elif dialect == "postgresql":
+            analyze = self.explain_analyze and statement.lstrip()[:6].upper() == "SELECT"
+            prefix = "EXPLAIN (ANALYZE, BUFFERS) " if analyze else "EXPLAIN "
+        else:
+            return None
+        # A plain DBAPI cursor: the EXPLAIN does not go through these events again.
+        # On Postgres a failed statement would abort the caller's transaction,
+        # so the EXPLAIN runs inside a savepoint.
+        savepoint = dialect == "postgresql"
+        cursor = conn.connection.cursor()
+        try:
+            if savepoint:
+                cursor.execute("SAVEPOINT slow_query_explain")
+            cursor.execute(prefix + statement, parameters)
+            rows = cursor.fetchall()
+            if savepoint:
+                cursor.execute("RELEASE SAVEPOINT slow_query_explain")
+        except Exception as exc:
+            if savepoint:
+                try:
+                    cursor.execute("ROLLBACK TO SAVEPOINT slow_query_explain")
+                except Exception:
+                    pass
+            self.stats["explain_errors"] += 1
+            logger.warning("EXPLAIN of a slow statement failed: %s", exc)
+            return [f"EXPLAIN failed: {exc}"]
+        finally:
+            cursor.close()
+        self.stats["explained"] += 1
+        return [str(row[-1] if dialect == "sqlite" else row[0]) for row in rows]
+
+
+slow_query_log = SlowQueryLog()
+
+
+class RequestScopeMiddleware:
+    """Makes the ASGI scope of the current request available to the slow query log."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+        token = request_scope.set(scope)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            request_scope.reset(token)
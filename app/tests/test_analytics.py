@@ -0,0 +1,114 @@
+import json
+import random
+import pytest
+from httpx import AsyncClient
+from asgi_lifespan import LifespanManager
+from app.main import app
+from app.database import SessionLocal, engine
+from app.analytics.sketch import QuantileSketch, RELATIVE_ACCURACY
+from app.analytics.distribution import player_sketch, rebuild_player_sketches
+
+
+@pytest.mark.asyncio
+async def test_user_history_is_keyset_paginated():
+    async with LifespanManager(app):
+        async with AsyncClient(app=app, base_url="http://test") as ac:
+            res = await ac.post("/auth/register", json={
+                "username": "history_player", "email": "history@example.com", "password": "test123"
+            })
+            user_id = res.json()["id"]
+            res = await ac.post("/auth/login", json={"email": "history@example.com", "password": "test123"})
+            headers = {"Authorization": f"Bearer {res.json()['access_token']}"}
+            for _ in range(3):
+                res = await ac.post("/games/start", headers=headers)
+                await ac.post(f"/games/{res.json()['session_id']}/stop", headers=headers)
+
+            first = (await ac.get(f"/analytics/user/{user_id}", params={"limit": 2})).json()
+            assert first["total_games"] == 3
+            assert len(first["history"]) == 2
+            assert first["next_cursor"]
+
+            second = (await ac.get(f"/analytics/user/{user_id}", params={"limit": 2, "cursor": first["next_cursor"]})).json()
+            assert len(second["history"]) == 1
+            assert second["next_cursor"] is None
+
+            ids = [g["session_id"] for g in first["history"] + second["history"]]
+            assert ids == sorted(ids, reverse=True)
+
+            res = await ac.get(f"/analytics/user/{user_id}/history.ndjson")
+            assert res.headers["content-type"].startswith("application/x-ndjson")
+            streamed = [json.loads(line) for line in res.text.splitlines()]
+            assert [g["session_id"] for g in streamed] == ids
+
+
+@pytest.mark.asyncio
+async def test_user_history_rejects_bad_cursor():
+    async with LifespanManager(app):
+        async with AsyncClient(app=app, base_url="http://test") as ac:
+            res = await ac.post("/auth/register", json={
+                "username": "cursor_player", "email": "cursor@example.com", "password": "test123"
+            })
+            user_id = res.json()["id"]
+            res = await ac.get(f"/analytics/user/{user_id}", params={"cursor": "not-a-cursor"})
+            assert res.status_code == 400
+            res = await ac.get("/analytics/user/999999/history.ndjson")
+            assert res.status_code == 404
+
+
+def test_quantile_sketch_is_accurate_and_mergeable():
+    rng = random.Random(7)
+    values = [rng.expovariate(1 / 300) for _ in range(20000)]
+    left, right = QuantileSketch(), QuantileSketch()
+    for i, value in enumerate(values):
+        (left if i % 2 else right).add(value)
+    left.merge(right)
+    sketch = QuantileSketch.from_json(left.to_json())
+
+    ordered = sorted(values)
+    assert sketch.count == len(values)
+    for q in (0.5, 0.9, 0.99):
+        exact = ordered[int(q * (len(ordered) - 1))]
+        assert sketch.quantile(q) == pytest.approx(exact, rel=RELATIVE_ACCURACY * 2)
+    assert sum(bucket["count"] for bucket in sketch.histogram(20)) == len(values)
+    assert len(sketch.to_json()) < 20000
+
+
+@pytest.mark.asyncio
+async def test_distribution_endpoints():
+    async with LifespanManager(app):
+        async with AsyncClient(app=app, base_url="http://test") as ac:
+            res = await ac.post("/auth/register", json={
+                "username": "sketch_player", "email": "sketch@example.com", "password": "test123"
+            })
+            user_id = res.json()["id"]
+            res = await ac.post("/auth/login", json={"email": "sketch@example.com", "password": "test123"})
+            headers = {"Authorization": f"Bearer {res.json()['access_token']}"}
+            deviations = []
+            for _ in range(3):
+                res = await ac.post("/games/start", headers=headers)
+                res = await ac.post(f"/games/{res.json()['session_id']}/stop", headers=headers)
+                deviations.append(res.json()["deviation_ms"])
+
+            res = await ac.get(f"/analytics/user/{user_id}/distribution", params={"bins": 4})
+            body = res.json()
+            assert body["games"] == 3
+            assert min(deviations) * 0.98 <= body["p50_ms"] <= max(deviations) * 1.02
+            assert body["p50_ms"] <= body["p90_ms"] <= body["p99_ms"]
+            assert len(body["histogram"]) == 4
+            assert sum(bucket["count"] for bucket in body["histogram"]) == 3
+
+            res = await ac.get("/analytics/distribution")
+            assert res.json()["games"] >= 3
+
+            res = await ac.get("/analytics/user/999999/distribution")
+            assert res.status_code == 404
+
+    try:
+        async with SessionLocal() as db:
+            _, before = await player_sketch(db, user_id)
+            await rebuild_player_sketches(db)
+            _, after = await player_sketch(db, user_id)
+    finally:
+        await engine.dispose()
+    assert after.count == before.count == 3
+    assert after.bins == before.bins
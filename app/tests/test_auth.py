@@ -0,0 +1,153 @@
+import asyncio
+import threading
+import time
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+from fastapi import HTTPException
+from app.auth import auth_dependencies
+from app.auth.auth_dependencies import get_current_user, invalidate_user, user_cache, TokenPrincipal
+from app.auth.cache import TTLCache
+from app.auth.routes import register
+from app.auth.schemas import UserCreate
+from app.auth.utils import PasswordHasher
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_ttl_cache_expires_and_evicts_lru():
+    clock = FakeClock()
+    cache = TTLCache(maxsize=2, ttl=10, clock=clock)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+
+    clock.now = 11
+    assert cache.get("a") is None
+    assert len(cache) == 1
+
+
+def test_ttl_cache_invalidates_by_owner():
+    cache = TTLCache(maxsize=10, ttl=10)
+    cache.set("token-1", "alice", owner=1)
+    cache.set("token-2", "alice", owner=1)
+    cache.set("token-3", "bob", owner=2)
+
+    cache.invalidate_owner(1)
+
+    assert cache.get("token-1") is None
+    assert cache.get("token-2") is None
+    assert cache.get("token-3") == "bob"
+
+
+def db_returning(user):
+    mock_db = AsyncMock()
+    mock_scalars = MagicMock()
+    mock_scalars.first.return_value = user
+    mock_result = MagicMock()
+    mock_result.scalars.return_value = mock_scalars
+    mock_db.execute.return_value = mock_result
+    return mock_db
+
+
+@patch("app.auth.auth_dependencies.jwt.decode")
+@pytest.mark.asyncio
+async def test_get_current_user_is_cached_per_token(mock_decode):
+    mock_decode.return_value = {"sub": "7", "exp": time.time() + 600}
+    mock_user = MagicMock(id=7)
+    mock_db = db_returning(mock_user)
+
+    first = await get_current_user(token="cached-token", db=mock_db)
+    second = await get_current_user(token="cached-token", db=mock_db)
+
+    assert first is second is mock_user
+    assert mock_db.execute.await_count == 1
+    assert mock_decode.call_count == 1
+
+    invalidate_user(7)
+    await get_current_user(token="cached-token", db=mock_db)
+    assert mock_db.execute.await_count == 2
+    invalidate_user(7)
+
+
+@patch("app.auth.auth_dependencies.jwt.decode")
+@pytest.mark.asyncio
+async def test_expired_token_is_not_cached(mock_decode):
+    mock_decode.return_value = {"sub": "8", "exp": time.time() - 1}
+    mock_db = db_returning(MagicMock(id=8))
+
+    await get_current_user(token="stale-token", db=mock_db)
+
+    assert user_cache.get("stale-token") is None
+
+
+@patch("app.auth.auth_dependencies.jwt.decode")
+@pytest.mark.asyncio
+async def test_trusted_claims_skip_user_lookup(mock_decode, monkeypatch):
+    monkeypatch.setattr(auth_dependencies, "TRUST_TOKEN_CLAIMS", True)
+    mock_decode.return_value = {"sub": "9", "username": "claims_user", "exp": time.time() + 600}
+    mock_db = AsyncMock()
+
+    user = await get_current_user(token="claims-token", db=mock_db)
+
+    assert isinstance(user, TokenPrincipal)
+    assert (user.id, user.username) == (9, "claims_user")
+    mock_db.execute.assert_not_awaited()
+    invalidate_user(9)
+
+
+@pytest.mark.asyncio
+async def test_register_hands_the_connection_back_before_hashing():
+    calls = []
+    mock_db = db_returning(None)
+    mock_db.add = MagicMock()
+    mock_db.commit.side_effect = lambda: calls.append("commit")
+    hasher = MagicMock()
+    hasher.hash = AsyncMock(side_effect=lambda password: calls.append("hash") or "hashed")
+
+    with patch("app.auth.routes.password_hasher", hasher):
+        user = await register(UserCreate(username="new_user", email="new@example.com", password="secret"), db=mock_db)
+
+    assert calls == ["commit", "hash", "commit"]
+    assert user.hashed_password == "hashed"
+
+
+@pytest.mark.asyncio
+async def test_password_hasher_runs_off_the_event_loop():
+    hasher = PasswordHasher(workers=2, max_pending=8)
+    loop_thread = threading.get_ident()
+    try:
+        hashed = await hasher.hash("supersecretpassword")
+        assert await hasher.verify("supersecretpassword", hashed)
+        assert not await hasher.verify("wrong", hashed)
+        assert await hasher._run(threading.get_ident) != loop_thread
+        assert hasher.completed == 4
+        assert hasher.pending == 0
+    finally:
+        hasher.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_password_hasher_rejects_when_queue_is_full():
+    hasher = PasswordHasher(workers=1, max_pending=1)
+    release = threading.Event()
+    try:
+        running = asyncio.create_task(hasher._run(release.wait))
+        await asyncio.sleep(0)
+        with pytest.raises(HTTPException) as exc_info:
+            await hasher._run(time.time)
+        assert exc_info.value.status_code == 503
+        assert hasher.rejected == 1
+        release.set()
+        assert await running
+    finally:
+        release.set()
+        hasher.shutdown()
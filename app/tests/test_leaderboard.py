@@ -0,0 +1,141 @@
+import pytest
+from datetime import datetime, timedelta
+from httpx import AsyncClient
+from asgi_lifespan import LifespanManager
+from sqlalchemy.future import select
+from app.main import app
+from app.database import SessionLocal
+from app.models import PlayerStats, PlayerStatsBucket, User
+from app.leaderboard.stats import rebuild_player_stats
+from app.leaderboard.cache import leaderboard_pages
+
+
+async def play_game(ac, email, username):
+    await ac.post("/auth/register", json={
+        "username": username,
+        "email": email,
+        "password": "test123"
+    })
+    res = await ac.post("/auth/login", json={"email": email, "password": "test123"})
+    token = res.json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    res = await ac.post("/games/start", headers=headers)
+    session_id = res.json()["session_id"]
+    res = await ac.post(f"/games/{session_id}/stop", headers=headers)
+    assert res.status_code == 200
+    return res.json()
+
+
+async def whole_board(ac, window):
+    """Every row of a board, page by page through the cursors."""
+    rows, params = [], {"window": window, "limit": 100}
+    while True:
+        res = await ac.get("/leaderboard/", params=params)
+        rows.extend(res.json())
+        if "x-next-cursor" not in res.headers:
+            return rows
+        params["cursor"] = res.headers["x-next-cursor"]
+
+
+async def stats_for(username):
+    async with SessionLocal() as db:
+        result = await db.execute(
+            select(PlayerStats).join(User, User.id == PlayerStats.user_id).where(User.username == username)
+        )
+        return result.scalars().first()
+
+
+@pytest.mark.asyncio
+async def test_stop_game_updates_player_stats():
+    async with LifespanManager(app):
+        async with AsyncClient(app=app, base_url="http://test") as ac:
+            first = await play_game(ac, "stats1@example.com", "stats_player1")
+            before = await stats_for("stats_player1")
+            second = await play_game(ac, "stats1@example.com", "stats_player1")
+
+    stats = await stats_for("stats_player1")
+    assert stats.games_played == before.games_played + 1
+    assert stats.deviation_sum == pytest.approx(before.deviation_sum + second["deviation_ms"], abs=0.01)
+    assert stats.avg_deviation == pytest.approx(stats.deviation_sum / stats.games_played)
+    assert stats.best_deviation <= min(first["deviation_ms"], second["deviation_ms"]) + 0.01
+    assert stats.last_played >= before.last_played
+
+
+@pytest.mark.asyncio
+async def test_rebuild_player_stats_matches_incremental():
+    async with LifespanManager(app):
+        async with AsyncClient(app=app, base_url="http://test") as ac:
+            await play_game(ac, "stats2@example.com", "stats_player2")
+
+    before = await stats_for("stats_player2")
+    async with SessionLocal() as db:
+        players = await rebuild_player_stats(db)
+    after = await stats_for("stats_player2")
+
+    assert players >= 1
+    assert after.games_played == before.games_played
+    assert after.avg_deviation == pytest.approx(before.avg_deviation)
+    assert after.best_deviation == pytest.approx(before.best_deviation)
+
+
+@pytest.mark.asyncio
+async def test_leaderboard_is_cached_until_a_game_is_stopped():
+    async with LifespanManager(app):
+        async with AsyncClient(app=app, base_url="http://test") as ac:
+            await play_game(ac, "etag1@example.com", "etag_player1")
+            first = await ac.get("/leaderboard/", params={"limit": 100})
+            etag = first.headers["etag"]
+            hits = leaderboard_pages.hits
+
+            res = await ac.get("/leaderboard/", params={"limit": 100}, headers={"If-None-Match": etag})
+            assert res.status_code == 304
+            assert res.content == b""
+            assert leaderboard_pages.hits == hits + 1
+
+            await play_game(ac, "etag2@example.com", "etag_player2")
+            res = await ac.get("/leaderboard/", params={"limit": 100}, headers={"If-None-Match": etag})
+            assert res.status_code == 200
+            assert res.headers["etag"] != etag
+            assert "etag_player2" in [row["username"] for row in res.json()]
+
+
+@pytest.mark.asyncio
+async def test_windowed_leaderboards_roll_up_buckets():
+    async with SessionLocal() as db:
+        old = User(username="window_old", email="window_old@example.com", hashed_password="")
+        db.add(old)
+        await db.flush()
+        db.add(PlayerStatsBucket(
+            user_id=old.id,
+            day=datetime.utcnow().date() - timedelta(days=3),
+            games_played=2,
+            deviation_sum=10.0,
+            best_deviation=4.0
+        ))
+        await db.commit()
+
+    async with LifespanManager(app):
+        async with AsyncClient(app=app, base_url="http://test") as ac:
+            # Played after the boards were loaded, so applied from the score event
+            await play_game(ac, "window1@example.com", "window_player")
+
+            daily = {row["username"]: row for row in await whole_board(ac, "daily")}
+            weekly = {row["username"]: row for row in await whole_board(ac, "weekly")}
+            assert (await ac.get("/leaderboard/", params={"window": "monthly"})).status_code == 422
+
+    assert "window_player" in daily and "window_old" not in daily
+    assert daily["window_player"]["total_games"] == 1
+    assert weekly["window_old"] == {
+        "username": "window_old", "total_games": 2, "average_deviation": 5.0, "best_deviation": 4.0
+    }
+    assert weekly["window_player"] == daily["window_player"]
+
+
+@pytest.mark.asyncio
+async def test_leaderboard_rejects_out_of_range_pages():
+    async with LifespanManager(app):
+        async with AsyncClient(app=app, base_url="http://test") as ac:
+            for path in ("/leaderboard/", "/games/"):
+                for params in ({"skip": -1}, {"limit": 0}, {"limit": -5}, {"limit": 101}):
+                    assert (await ac.get(path, params=params)).status_code == 422
+                assert (await ac.get(path, params={"skip": 0, "limit": 100})).status_code == 200
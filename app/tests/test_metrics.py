@@ -0,0 +1,60 @@
+import pytest
+from httpx import AsyncClient
+from asgi_lifespan import LifespanManager
+from app.main import app
+from app.metrics import Registry
+from app.games.sweeper import sweeper
+from app.auth.utils import password_hasher
+from app.games.writer import session_writer
+
+
+def sample(text, series):
+    for line in text.splitlines():
+        if line.startswith(series + " "):
+            return float(line.rsplit(" ", 1)[1])
+    return None
+
+
+def test_histogram_renders_cumulative_buckets():
+    registry = Registry()
+    histogram = registry.histogram("job_seconds", "Job time.", ("kind",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.5, 3.0):
+        histogram.observe(value, 'a"b')
+
+    text = registry.render()
+    assert sample(text, 'job_seconds_bucket{kind="a\\"b",le="0.1"}') == 1
+    assert sample(text, 'job_seconds_bucket{kind="a\\"b",le="1"}') == 3
+    assert sample(text, 'job_seconds_bucket{kind="a\\"b",le="+Inf"}') == 4
+    assert sample(text, 'job_seconds_count{kind="a\\"b"}') == 4
+    assert sample(text, 'job_seconds_sum{kind="a\\"b"}') == pytest.approx(4.05)
+    with pytest.raises(ValueError):
+        registry.counter("job_seconds", "Again.")
+
+
+@pytest.mark.asyncio
+async def test_metrics_endpoint_reports_routes_and_statements():
+    async with LifespanManager(app):
+        async with AsyncClient(app=app, base_url="http://test") as ac:
+            before = (await ac.get("/metrics")).text
+            await ac.get("/leaderboard/")
+            await ac.get("/leaderboard/")
+            await ac.get("/no-such-page")
+            res = await ac.get("/metrics")
+
+    assert res.status_code == 200
+    assert res.headers["content-type"].startswith("text/plain; version=0.0.4")
+    text = res.text
+    route = 'http_request_duration_seconds_count{method="GET",route="/leaderboard/",status="200"}'
+    assert sample(text, route) == (sample(before, route) or 0) + 2
+    assert sample(text, 'http_request_duration_seconds_count{method="GET",route="<unmatched>",status="404"}') >= 1
+    # The scrape itself is in flight while it renders
+    assert sample(text, "http_requests_in_flight") == 1
+    assert sample(text, 'db_statement_duration_seconds_count{operation="SELECT"}') > 0
+    assert sample(text, "db_pool_checkout_wait_seconds_count") > 0
+    assert sample(text, 'websocket_connections{window="all"}') == 0
+    assert sample(text, "sweeper_runs_total") == sweeper.stats["runs"]
+    assert sample(text, "sweeper_sessions_expired_total") == sweeper.stats["expired"]
+    assert sample(text, "password_hash_pending") == 0
+    assert sample(text, "password_hash_rejected_total") == password_hasher.rejected
+    assert sample(text, 'websocket_clients_evicted_total{window="all"}') is not None
+    assert sample(text, "session_writer_batches_total") == session_writer.stats["batches"]
@@ -0,0 +1,81 @@
+import pytest
+from datetime import datetime, timedelta
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import create_async_engine
+from app.migrations.runner import current_revision, head_revision, upgrade, verify
+
+
+@pytest.mark.asyncio
+async def test_upgrade_is_idempotent(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path}/migrations.db")
+    try:
+        assert await current_revision(engine) == 0
+        with pytest.raises(RuntimeError, match="app.migrations upgrade"):
+            await verify(engine)
+        applied = await upgrade(engine)
+        assert [module.revision for module in applied] == list(range(1, head_revision() + 1))
+        assert await current_revision(engine) == head_revision()
+        assert await upgrade(engine) == []
+        assert await verify(engine) == head_revision()
+    finally:
+        await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_verify_accepts_a_newer_schema(tmp_path, caplog):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path}/migrations.db")
+    try:
+        await upgrade(engine)
+        # A later build has already migrated this database
+        async with engine.begin() as conn:
+            await conn.execute(
+                text("INSERT INTO schema_version (version, description, applied_at) VALUES (:version, 'newer', :at)"),
+                {"version": head_revision() + 1, "at": datetime.utcnow()}
+            )
+        assert await verify(engine) == head_revision() + 1
+        assert "ahead of this build" in caplog.text
+    finally:
+        await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_one_started_session_per_user(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path}/migrations.db")
+    try:
+        await upgrade(engine, target=1)
+        async with engine.begin() as conn:
+            await conn.execute(text("INSERT INTO users (id, username) VALUES (1, 'dup')"))
+            for _ in range(3):
+                await conn.execute(text("INSERT INTO game_sessions (user_id, status) VALUES (1, 'started')"))
+
+        await upgrade(engine)
+        async with engine.connect() as conn:
+            started = await conn.scalar(text("SELECT COUNT(*) FROM game_sessions WHERE status = 'started'"))
+            assert started == 1
+            with pytest.raises(IntegrityError):
+                await conn.execute(text("INSERT INTO game_sessions (user_id, status) VALUES (1, 'started')"))
+    finally:
+        await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_buckets_backfilled_from_recent_games(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path}/migrations.db")
+    recent = datetime.utcnow() - timedelta(days=1)
+    try:
+        await upgrade(engine, target=2)
+        async with engine.begin() as conn:
+            await conn.execute(text("INSERT INTO users (id, username) VALUES (1, 'buckets')"))
+            for stop_time, deviation in ((recent, 30.0), (recent, 10.0), (recent - timedelta(days=30), 1.0)):
+                await conn.execute(
+                    text("INSERT INTO game_sessions (user_id, status, stop_time, deviation) VALUES (1, 'stopped', :stop_time, :deviation)"),
+                    {"stop_time": stop_time, "deviation": deviation}
+                )
+
+        await upgrade(engine)
+        async with engine.connect() as conn:
+            rows = (await conn.execute(text("SELECT day, games_played, deviation_sum, best_deviation FROM player_stats_buckets"))).all()
+        assert rows == [(recent.date().isoformat(), 2, 40.0, 10.0)]
+    finally:
+        await engine.dispose()
@@ -0,0 +1,52 @@
+import pytest
+from app.pubsub import PubSub, InProcessPubSub, PostgresPubSub, create_pubsub
+from app.leaderboard.events import apply_score
+from app.leaderboard.ranking import leaderboard_index, LeaderboardEntry
+
+
+@pytest.mark.asyncio
+async def test_in_process_pubsub_delivers_to_all_handlers():
+    pubsub = InProcessPubSub()
+    received = []
+
+    async def async_handler(payload):
+        received.append(("async", payload))
+
+    def broken_handler(payload):
+        raise RuntimeError("boom")
+
+    pubsub.subscribe("scores", broken_handler)
+    pubsub.subscribe("scores", async_handler)
+    pubsub.subscribe("scores", lambda payload: received.append(("sync", payload)))
+    pubsub.subscribe("other", lambda payload: received.append(("other", payload)))
+
+    await pubsub.publish("scores", {"user_id": 1})
+
+    assert received == [("async", {"user_id": 1}), ("sync", {"user_id": 1})]
+
+
+def test_create_pubsub_backends():
+    assert isinstance(create_pubsub("memory"), InProcessPubSub)
+    backend = create_pubsub("postgres", "postgresql+asyncpg://u:p@db:5432/timeitright")
+    assert isinstance(backend, PostgresPubSub)
+    assert backend.dsn == "postgresql://u:p@db:5432/timeitright"
+    with pytest.raises(ValueError):
+        create_pubsub("carrier-pigeon")
+    # A backend has to say how it publishes
+    with pytest.raises(TypeError):
+        PubSub()
+
+
+def test_apply_score_updates_warm_index():
+    leaderboard_index.load([LeaderboardEntry(1, "first", 3, 50.0, 10.0)])
+    try:
+        apply_score({
+            "user_id": 2,
+            "username": "second",
+            "games_played": 1,
+            "avg_deviation": 20.0,
+            "best_deviation": 20.0,
+        })
+        assert [e.username for e in leaderboard_index.top(10)] == ["second", "first"]
+    finally:
+        leaderboard_index.reset()
@@ -0,0 +1,182 @@
+import random
+import uuid
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+import pytest
+from httpx import AsyncClient
+from asgi_lifespan import LifespanManager
+from app.main import app
+from app.database import SessionLocal, engine
+from app.leaderboard.ranking import RankedLeaderboard, LeaderboardEntry, WindowLeaderboard, WARM_ATTEMPTS, leaderboard_index
+from app.leaderboard.routes import rank_around, leaderboard_entries, leaderboard_row
+
+
+def make_entry(user_id, avg):
+    return LeaderboardEntry(user_id, f"user{user_id}", 1, avg, avg)
+
+
+def expected_order(entries):
+    return [e.user_id for e in sorted(entries.values(), key=lambda e: (e.avg_deviation, e.user_id))]
+
+
+def test_ranked_leaderboard_matches_sorted_list():
+    rng = random.Random(42)
+    board = RankedLeaderboard()
+    entries = {}
+
+    for _ in range(3000):
+        user_id = rng.randint(1, 300)
+        if rng.random() < 0.2:
+            board.remove(user_id)
+            entries.pop(user_id, None)
+        else:
+            entry = make_entry(user_id, rng.choice([100.0, 250.0, rng.uniform(0, 5000)]))
+            board.upsert(entry)
+            entries[user_id] = entry
+
+    order = expected_order(entries)
+    assert len(board) == len(order)
+    assert [e.user_id for e in board.page(0, len(order))] == order
+    assert [e.user_id for e in board.page(17, 25)] == order[17:42]
+    assert board.page_after(entries[order[16]].key, 25) == board.page(17, 25)
+    for position, user_id in enumerate(order, start=1):
+        assert board.rank_of(user_id) == position
+
+
+def test_ranked_leaderboard_ties_break_on_user_id():
+    board = RankedLeaderboard()
+    board.load([make_entry(3, 50.0), make_entry(1, 50.0), make_entry(2, 10.0)])
+
+    assert [e.user_id for e in board.top(10)] == [2, 1, 3]
+    assert board.rank_of(3) == 3
+    assert board.rank_of(99) is None
+    assert board.page(5, 10) == []
+    with pytest.raises(ValueError):
+        board.page(-1, 10)
+
+
+def test_ranked_leaderboard_version_changes_on_write():
+    board = RankedLeaderboard()
+    board.load([])
+    version = board.version
+
+    board.upsert(make_entry(1, 10.0))
+    assert board.version > version
+
+    version = board.version
+    board.remove(42)
+    assert board.version == version
+
+
+@pytest.mark.asyncio
+async def test_window_warm_gives_up_while_games_keep_arriving():
+    board = WindowLeaderboard(7)
+
+    class BusyDatabase:
+        """Every rollup races a stopped game."""
+        calls = 0
+
+        async def execute(self, query):
+            self.calls += 1
+            board.record(1, "busy", 5.0, datetime.utcnow().date())
+            return SimpleNamespace(all=lambda: [])
+
+    db = BusyDatabase()
+    await board.ensure_current(db)
+    assert db.calls == WARM_ATTEMPTS
+    # Read from SQL over the right window instead
+    assert not board.ready
+    assert board.first_day == datetime.utcnow().date() - timedelta(days=6)
+
+
+@pytest.mark.asyncio
+async def test_leaderboard_index_follows_stop_game():
+    async with LifespanManager(app):
+        assert leaderboard_index.ready
+        async with AsyncClient(app=app, base_url="http://test") as ac:
+            await ac.post("/auth/register", json={
+                "username": "ranked_player",
+                "email": "ranked@example.com",
+                "password": "test123"
+            })
+            res = await ac.post("/auth/login", json={"email": "ranked@example.com", "password": "test123"})
+            headers = {"Authorization": f"Bearer {res.json()['access_token']}"}
+            res = await ac.post("/games/start", headers=headers)
+            await ac.post(f"/games/{res.json()['session_id']}/stop", headers=headers)
+
+            user_id = next(e.user_id for e in leaderboard_index.page(0, len(leaderboard_index)) if e.username == "ranked_player")
+            rank = leaderboard_index.rank_of(user_id)
+            res = await ac.get("/leaderboard/", params={"skip": rank - 1, "limit": 1})
+            assert res.json()[0]["username"] == "ranked_player"
+
+    assert not leaderboard_index.ready
+
+
+@pytest.mark.asyncio
+async def test_rank_with_neighbours_from_index_and_database():
+    tag = uuid.uuid4().hex[:10]
+    username, email = f"me_{tag}", f"me_{tag}@example.com"
+    async with LifespanManager(app):
+        async with AsyncClient(app=app, base_url="http://test") as ac:
+            await ac.post("/auth/register", json={"username": username, "email": email, "password": "test123"})
+            res = await ac.post("/auth/login", json={"email": email, "password": "test123"})
+            headers = {"Authorization": f"Bearer {res.json()['access_token']}"}
+            assert (await ac.get("/leaderboard/me", headers=headers)).status_code == 404
+            res = await ac.post("/games/start", headers=headers)
+            await ac.post(f"/games/{res.json()['session_id']}/stop", headers=headers)
+
+            me = (await ac.get("/leaderboard/me", headers=headers, params={"k": 2})).json()
+            user_id = next(e.user_id for e in leaderboard_index.page(0, len(leaderboard_index)) if e.username == username)
+            assert me == (await ac.get(f"/leaderboard/user/{user_id}", params={"k": 2})).json()
+            top_id = leaderboard_index.page(0, 1)[0].user_id
+            top = (await ac.get(f"/leaderboard/user/{top_id}", params={"k": 2})).json()
+
+    assert me["username"] == username
+    assert me["players"] >= 1
+    assert me["percentile"] == round(100 * (me["players"] - me["rank"]) / me["players"], 2)
+    ranks = [row["rank"] for row in me["neighbours"]]
+    assert ranks == list(range(max(1, me["rank"] - 2), min(me["players"], me["rank"] + 2) + 1))
+    # Nobody above the leader: only the two below
+    assert top["rank"] == 1
+    assert [row["rank"] for row in top["neighbours"]] == list(range(1, min(top["players"], 3) + 1))
+    assert {**me["neighbours"][ranks.index(me["rank"])], "percentile": me["percentile"], "players": me["players"], "neighbours": me["neighbours"]} == me
+
+    # Same answer counted in the database, before the index is warm
+    try:
+        async with SessionLocal() as db:
+            assert await rank_around(db, user_id, 2, "all") == me
+            assert await rank_around(db, top_id, 2, "all") == top
+    finally:
+        await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_cursor_pages_walk_the_board():
+    async with LifespanManager(app):
+        async with AsyncClient(app=app, base_url="http://test") as ac:
+            for i in range(4):
+                await ac.post("/auth/register", json={"username": f"cursor{i}", "email": f"cursor{i}@example.com", "password": "test123"})
+                res = await ac.post("/auth/login", json={"email": f"cursor{i}@example.com", "password": "test123"})
+                headers = {"Authorization": f"Bearer {res.json()['access_token']}"}
+                res = await ac.post("/games/start", headers=headers)
+                await ac.post(f"/games/{res.json()['session_id']}/stop", headers=headers)
+
+            expected = [leaderboard_row(e) for e in leaderboard_index.page(0, len(leaderboard_index))]
+            walked, cursor = [], None
+            while True:
+                res = await ac.get("/leaderboard/", params={"limit": 3, **({"cursor": cursor} if cursor else {})})
+                walked += res.json()
+                cursor = res.headers.get("x-next-cursor")
+                if cursor is None:
+                    break
+            assert walked == expected
+            assert (await ac.get("/leaderboard/", params={"cursor": "not-a-cursor"})).status_code == 400
+
+    # The database path pages the same way
+    try:
+        async with SessionLocal() as db:
+            first = await leaderboard_entries(db, limit=2)
+            after = await leaderboard_entries(db, limit=2, after=(first[-1].avg_deviation, first[-1].user_id))
+            assert [r.user_id for r in first + after] == [r.user_id for r in await leaderboard_entries(db, limit=4)]
+    finally:
+        await engine.dispose()
@@ -0,0 +1,74 @@
+import pytest
+from httpx import AsyncClient
+from asgi_lifespan import LifespanManager
+from sqlalchemy import event, update
+from sqlalchemy.future import select
+from app.main import app
+from app.database import engine, SessionLocal
+from app.games.registry import active_sessions
+from app.models import GameSession, User
+
+
+async def login(ac, email, username):
+    await ac.post("/auth/register", json={"username": username, "email": email, "password": "test123"})
+    res = await ac.post("/auth/login", json={"email": email, "password": "test123"})
+    async with SessionLocal() as db:
+        user_id = (await db.execute(select(User.id).where(User.email == email))).scalar_one()
+    return {"Authorization": f"Bearer {res.json()['access_token']}"}, user_id
+
+
+class SessionStatements:
+    """Records the statements on game_sessions sent while active."""
+
+    def __init__(self):
+        self.statements = []
+
+    def __enter__(self):
+        event.listen(engine.sync_engine, "before_cursor_execute", self._record)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(engine.sync_engine, "before_cursor_execute", self._record)
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        if "game_sessions" in statement:
+            self.statements.append(statement.split()[0].upper())
+
+
+@pytest.mark.asyncio
+async def test_start_and_stop_write_without_reading_sessions():
+    async with LifespanManager(app):
+        async with AsyncClient(app=app, base_url="http://test") as ac:
+            headers, user_id = await login(ac, "registry@example.com", "registry_player")
+            with SessionStatements() as recorded:
+                res = await ac.post("/games/start", headers=headers)
+                session_id = res.json()["session_id"]
+                assert active_sessions.get(user_id).session_id == session_id
+                res = await ac.post(f"/games/{session_id}/stop", headers=headers)
+
+            assert res.status_code == 200
+            assert recorded.statements == ["INSERT", "UPDATE"]
+            assert active_sessions.get(user_id) is None
+
+
+@pytest.mark.asyncio
+async def test_registry_reloads_at_boot_and_yields_to_the_database():
+    async with LifespanManager(app):
+        async with AsyncClient(app=app, base_url="http://test") as ac:
+            headers, user_id = await login(ac, "registry2@example.com", "registry_player2")
+            res = await ac.post("/games/start", headers=headers)
+            session_id = res.json()["session_id"]
+
+    assert len(active_sessions) == 0
+    async with LifespanManager(app):
+        assert active_sessions.get(user_id).session_id == session_id
+
+        # Stopped elsewhere, e.g. on another worker: this registry is stale
+        async with SessionLocal() as db:
+            await db.execute(update(GameSession).where(GameSession.id == session_id).values(status="stopped"))
+            await db.commit()
+
+        async with AsyncClient(app=app, base_url="http://test") as ac:
+            res = await ac.post(f"/games/{session_id}/stop", headers=headers)
+            assert res.status_code == 400
+            assert active_sessions.get(user_id) is None
@@ -0,0 +1,43 @@
+import pytest
+from httpx import AsyncClient
+from asgi_lifespan import LifespanManager
+from app.main import app
+from app.slow_queries import normalize_sql, params_shape, slow_query_log
+
+
+def test_statements_are_normalized_to_their_shape():
+    sql = normalize_sql("""
+        SELECT * FROM game_sessions
+        WHERE user_id IN (?, ?, ?) AND status = 'stopped' AND deviation > 12.5 AND id = $1
+    """)
+    assert sql == "SELECT * FROM game_sessions WHERE user_id IN (...) AND status = ? AND deviation > ? AND id = $1"
+    assert normalize_sql("INSERT INTO t (a, b) VALUES (?, ?), (?, ?), (?, ?)") == "INSERT INTO t (a, b) VALUES (...)"
+    assert params_shape((1, "x", None)) == ["int", "str", "null"]
+    assert params_shape([(1, 2.0), (3, 4.0)], executemany=True) == {"rows": 2, "each": ["int", "float"]}
+
+
+@pytest.mark.asyncio
+async def test_slow_statements_are_recorded_with_route_and_plan(monkeypatch):
+    monkeypatch.setattr("app.auth.auth_dependencies.ADMIN_TOKEN", "admin-secret")
+    # Every statement counts as slow
+    monkeypatch.setattr(slow_query_log, "threshold_ms", 0)
+    slow_query_log.clear()
+    try:
+        async with LifespanManager(app):
+            async with AsyncClient(app=app, base_url="http://test") as ac:
+                assert (await ac.get("/admin/slow-queries")).status_code == 403
+                slow_query_log.clear()
+                await ac.get("/analytics/user/1")
+                res = await ac.get("/admin/slow-queries", headers={"X-Admin-Token": "admin-secret"})
+                assert res.status_code == 200
+                entries = res.json()["entries"]
+                assert (await ac.delete("/admin/slow-queries", headers={"X-Admin-Token": "admin-secret"})).status_code == 204
+    finally:
+        slow_query_log.clear()
+
+    from_route = [entry for entry in entries if entry["route"] == "/analytics/user/{user_id}"]
+    assert from_route
+    assert all(entry["sql"].startswith(("SELECT", "WITH")) for entry in from_route)
+    assert all(entry["params"] is not None for entry in from_route)
+    # SQLite plans come from EXPLAIN QUERY PLAN
+    assert any(entry["plan"] for entry in from_route)
@@ -0,0 +1,84 @@
+import uuid
+import pytest
+import pytest_asyncio
+from datetime import datetime, timedelta
+from sqlalchemy.future import select
+from app.database import SessionLocal, engine
+from app.games.sweeper import SessionSweeper
+from app.models import GameSession, PlayerStatsBucket, User
+
+
+@pytest_asyncio.fixture(autouse=True)
+async def dispose_engine():
+    # These tests use the shared engine outside the app lifespan; drop its
+    # connections so the next test's event loop doesn't inherit them
+    yield
+    await engine.dispose()
+
+
+async def create_sessions(ages):
+    """One started session per new user, started ``age`` ago."""
+    now = datetime.utcnow()
+    async with SessionLocal() as db:
+        sessions = []
+        for age in ages:
+            tag = uuid.uuid4().hex[:10]
+            user = User(username=f"sweep_{tag}", email=f"sweep_{tag}@example.com", hashed_password="")
+            db.add(user)
+            await db.flush()
+            session = GameSession(user_id=user.id, start_time=now - age, status="started")
+            db.add(session)
+            sessions.append(session)
+        await db.commit()
+        return [s.id for s in sessions]
+
+
+async def statuses(ids):
+    async with SessionLocal() as db:
+        result = await db.execute(select(GameSession.id, GameSession.status).where(GameSession.id.in_(ids)))
+        return dict(result.all())
+
+
+@pytest.mark.asyncio
+async def test_sweep_expires_stale_sessions_in_batches():
+    stale = await create_sessions([timedelta(minutes=31), timedelta(hours=2), timedelta(days=3)])
+    fresh = await create_sessions([timedelta(minutes=5)])
+
+    sweeper = SessionSweeper(batch_size=2)
+    expired = await sweeper.sweep()
+
+    assert expired >= 3
+    assert set((await statuses(stale)).values()) == {"expired"}
+    assert (await statuses(fresh))[fresh[0]] == "started"
+    assert sweeper.stats["runs"] == 1
+    assert sweeper.stats["expired"] == expired
+
+
+@pytest.mark.asyncio
+async def test_sweep_is_bounded_per_run():
+    stale = await create_sessions([timedelta(hours=1)] * 3)
+
+    sweeper = SessionSweeper(batch_size=1, max_batches=2)
+    assert await sweeper.sweep() == 2
+    await sweeper.sweep()
+
+    assert set((await statuses(stale)).values()) == {"expired"}
+
+
+@pytest.mark.asyncio
+async def test_sweep_compacts_old_buckets():
+    (session_id,) = await create_sessions([timedelta(minutes=1)])
+    today = datetime.utcnow().date()
+    async with SessionLocal() as db:
+        user_id = (await db.get(GameSession, session_id)).user_id
+        for age in (0, 7, 30):
+            db.add(PlayerStatsBucket(user_id=user_id, day=today - timedelta(days=age), games_played=1, deviation_sum=1.0, best_deviation=1.0))
+        await db.commit()
+
+    sweeper = SessionSweeper()
+    await sweeper.sweep()
+
+    async with SessionLocal() as db:
+        result = await db.execute(select(PlayerStatsBucket.day).where(PlayerStatsBucket.user_id == user_id))
+        assert sorted(result.scalars().all()) == [today - timedelta(days=7), today]
+    assert sweeper.stats["buckets_compacted"] >= 1
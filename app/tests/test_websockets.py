@@ -0,0 +1,332 @@
+import asyncio
+import json
+import pytest
+from fastapi import WebSocketDisconnect
+from sqlalchemy import text
+from app.database import engine
+from app.websockets.leaderboard import ConnectionManager, LeaderboardPublisher, diff_leaderboards, leaderboard_websocket_endpoint
+from app.websockets import encoding
+from app.websockets.encoding import Frame, MSGPACK, msgpack
+
+
+class RecordingManager:
+    def __init__(self):
+        self.active_connections = [object()]
+        self.messages = []
+
+    def broadcast(self, message):
+        self.messages.append(getattr(message, "message", message))
+
+
+def board_publisher(manager, boards, interval=60, history=64):
+    publisher = LeaderboardPublisher(manager, interval=interval, history=history)
+    boards = iter(boards)
+
+    async def leaderboard(db):
+        return [{"rank": rank, **row} for rank, row in enumerate(next(boards), start=1)]
+
+    publisher.leaderboard = leaderboard
+    return publisher
+
+
+def row(username, avg=100.0, games=1):
+    return {"username": username, "total_games": games, "average_deviation": avg, "best_deviation": avg}
+
+
+def test_diff_leaderboards_reports_row_changes():
+    old = [{"rank": 1, **row("a")}, {"rank": 2, **row("b", 200.0)}, {"rank": 3, **row("c", 300.0)}]
+    new = [{"rank": 1, **row("b", 200.0)}, {"rank": 2, **row("a", 250.0, games=2)}, {"rank": 3, **row("d", 400.0)}]
+
+    assert diff_leaderboards(old, new) == [
+        {"op": "exit", "username": "c"},
+        {"op": "move", "username": "b", "rank": 1},
+        {"op": "update", "row": new[1]},
+        {"op": "enter", "row": new[2]},
+    ]
+
+
+@pytest.mark.asyncio
+async def test_publisher_sends_deltas_only_on_change():
+    manager = RecordingManager()
+    publisher = board_publisher(manager, [[row("a")], [row("a")], [row("a"), row("b", 200.0)]])
+
+    assert await publisher.publish()
+    assert manager.messages == []
+    assert publisher.latest["type"] == "snapshot"
+    assert publisher.latest["version"] == 1
+
+    assert not await publisher.publish()
+    assert publisher.version == 1
+
+    assert await publisher.publish()
+    assert manager.messages == [{
+        "type": "delta",
+        "epoch": publisher.epoch,
+        "version": 2,
+        "base_version": 1,
+        "changes": [{"op": "enter", "row": {"rank": 2, **row("b", 200.0)}}],
+    }]
+    assert publisher.latest["leaderboard"][1]["username"] == "b"
+
+
+@pytest.mark.asyncio
+async def test_publisher_resume_from_known_version():
+    manager = RecordingManager()
+    boards = [[row("a", avg)] for avg in (100.0, 90.0, 80.0, 70.0, 60.0)]
+    publisher = board_publisher(manager, boards, history=3)
+    for _ in boards:
+        await publisher.publish()
+
+    assert publisher.version == 5
+    assert [d.message["version"] for d in publisher.resume(publisher.epoch, 3)] == [4, 5]
+    assert publisher.resume(publisher.epoch, 5) == []
+    assert publisher.resume(publisher.epoch, 1) is None
+    assert publisher.resume(publisher.epoch, 9) is None
+    assert publisher.resume("other-process", 4) is None
+
+
+@pytest.mark.asyncio
+async def test_publisher_wakes_up_on_notify():
+    manager = RecordingManager()
+    publisher = board_publisher(manager, [[row("a")], [row("b")]])
+    await publisher.publish()
+    publisher.start()
+    try:
+        publisher.notify()
+        for _ in range(50):
+            if manager.messages:
+                break
+            await asyncio.sleep(0.01)
+        assert [m["version"] for m in manager.messages] == [2]
+    finally:
+        await publisher.stop()
+    assert publisher.latest is None
+
+
+@pytest.mark.asyncio
+async def test_publisher_idle_without_viewers():
+    manager = RecordingManager()
+    manager.active_connections = []
+    publisher = board_publisher(manager, [[row("a")]], interval=0.01)
+    publisher.start()
+    await asyncio.sleep(0.05)
+    await publisher.stop()
+    assert manager.messages == []
+
+
+class FakeSocket:
+    def __init__(self, stalled=False, broken=False):
+        self.sent = []
+        self.closed_with = None
+        self.stalled = stalled
+        self.broken = broken
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, data):
+        if self.broken:
+            raise RuntimeError("connection reset")
+        if self.stalled:
+            await asyncio.Event().wait()
+        self.sent.append(json.loads(data))
+
+    async def send_bytes(self, data):
+        self.sent.append(msgpack.unpackb(data))
+
+    async def close(self, code=1000):
+        self.closed_with = code
+
+
+class ViewerSocket(FakeSocket):
+    """A viewer of the endpoint that stays until ``leave()`` is called."""
+
+    def __init__(self, **query_params):
+        super().__init__()
+        self.query_params = query_params
+        self._left = asyncio.Event()
+
+    async def receive_text(self):
+        await self._left.wait()
+        raise WebSocketDisconnect()
+
+    def leave(self):
+        self._left.set()
+
+
+async def drain():
+    for _ in range(20):
+        await asyncio.sleep(0)
+
+
+@pytest.mark.asyncio
+async def test_broadcast_not_held_up_by_stalled_client():
+    manager = ConnectionManager(queue_size=2, max_lagging=1000)
+    fast, stalled = FakeSocket(), FakeSocket(stalled=True)
+    await manager.connect(fast)
+    await manager.connect(stalled)
+
+    for tick in range(10):
+        manager.broadcast({"tick": tick})
+        await drain()
+
+    assert [m["tick"] for m in fast.sent] == list(range(10))
+    queued = manager.active_connections[stalled].queue
+    assert [f.message["tick"] for f in queued] == [9]
+    assert manager.stats["frames_coalesced"] > 0
+    manager.disconnect(fast)
+    manager.disconnect(stalled)
+
+
+@pytest.mark.asyncio
+async def test_dropped_deltas_are_replaced_by_snapshot():
+    manager = ConnectionManager(queue_size=2, max_lagging=1000)
+    manager.resync = lambda: Frame({"type": "snapshot", "version": 7})
+    stalled = FakeSocket(stalled=True)
+    await manager.connect(stalled)
+
+    for version in range(1, 8):
+        manager.broadcast({"type": "delta", "version": version})
+        await drain()
+
+    queued = [f.message for f in manager.active_connections[stalled].queue]
+    assert queued[0] == {"type": "snapshot", "version": 7}
+    assert all(m["version"] == 7 for m in queued)
+    manager.disconnect(stalled)
+
+
+@pytest.mark.asyncio
+async def test_lagging_client_is_evicted():
+    manager = ConnectionManager(queue_size=2, max_lagging=4)
+    stalled = FakeSocket(stalled=True)
+    await manager.connect(stalled)
+
+    for tick in range(20):
+        manager.broadcast({"tick": tick})
+        await drain()
+
+    assert stalled not in manager.active_connections
+    assert stalled.closed_with == 1013
+    assert manager.stats["clients_evicted"] == 1
+
+
+@pytest.mark.asyncio
+async def test_failed_send_drops_only_that_client():
+    manager = ConnectionManager()
+    healthy, broken = FakeSocket(), FakeSocket(broken=True)
+    await manager.connect(broken)
+    await manager.connect(healthy)
+
+    manager.broadcast({"tick": 1})
+    await drain()
+
+    assert broken not in manager.active_connections
+    assert healthy.sent == [{"tick": 1}]
+    assert manager.stats["send_errors"] == 1
+    manager.disconnect(healthy)
+
+
+@pytest.mark.asyncio
+async def test_broadcast_encodes_each_frame_once(monkeypatch):
+    calls = []
+    dumps_json = encoding.dumps_json
+
+    def counting_dumps(message):
+        calls.append(message)
+        return dumps_json(message)
+
+    monkeypatch.setattr(encoding, "dumps_json", counting_dumps)
+    manager = ConnectionManager()
+    sockets = [FakeSocket() for _ in range(20)]
+    for socket in sockets:
+        await manager.connect(socket)
+
+    manager.broadcast({"type": "delta", "version": 1})
+    await drain()
+
+    assert len(calls) == 1
+    assert all(socket.sent == [{"type": "delta", "version": 1}] for socket in sockets)
+    for socket in sockets:
+        manager.disconnect(socket)
+
+
+@pytest.mark.skipif(msgpack is None, reason="msgpack not installed")
+@pytest.mark.asyncio
+async def test_msgpack_clients_get_binary_frames():
+    manager = ConnectionManager()
+    text_client, binary_client = FakeSocket(), FakeSocket()
+    await manager.connect(text_client)
+    await manager.connect(binary_client, encoding=MSGPACK)
+
+    manager.broadcast({"type": "snapshot", "version": 3})
+    await drain()
+
+    assert text_client.sent == binary_client.sent == [{"type": "snapshot", "version": 3}]
+    assert manager.active_connections[binary_client].encoding == MSGPACK
+    manager.disconnect(text_client)
+    manager.disconnect(binary_client)
+
+
+@pytest.mark.asyncio
+async def test_viewer_joining_a_changed_board_gets_snapshot_first(monkeypatch):
+    manager = ConnectionManager()
+    boards = [[row("a")], [row("a"), row("b", 200.0)], [row("a"), row("b", 200.0)], [row("c", 50.0)], [row("c", 50.0)]]
+    publisher = board_publisher(manager, boards)
+    monkeypatch.setattr("app.websockets.leaderboard.publishers", {"all": publisher})
+
+    first = ViewerSocket()
+    viewing = asyncio.create_task(leaderboard_websocket_endpoint(first))
+    await drain()
+    first.leave()
+    await viewing
+
+    # The board changed while nobody watched; the next viewer starts from a snapshot
+    second = ViewerSocket()
+    viewing = asyncio.create_task(leaderboard_websocket_endpoint(second))
+    await drain()
+    assert [(m["type"], m["version"]) for m in second.sent] == [("snapshot", 2)]
+
+    # A resuming client gets each missed delta exactly once
+    resuming = ViewerSocket(epoch=publisher.epoch, version="1")
+    resumed = asyncio.create_task(leaderboard_websocket_endpoint(resuming))
+    await drain()
+    assert [(m["type"], m["version"]) for m in resuming.sent] == [("delta", 2)]
+
+    # A change seen by a joining viewer reaches those already watching as a delta
+    third = ViewerSocket()
+    joined = asyncio.create_task(leaderboard_websocket_endpoint(third))
+    await drain()
+    assert [(m["type"], m["version"]) for m in third.sent] == [("snapshot", 3)]
+    assert [(m["type"], m["version"]) for m in second.sent] == [("snapshot", 2), ("delta", 3)]
+    assert [(m["type"], m["version"]) for m in resuming.sent] == [("delta", 2), ("delta", 3)]
+
+    for socket in (second, resuming, third):
+        socket.leave()
+    await asyncio.gather(viewing, resumed, joined)
+    assert not manager.active_connections
+
+
+@pytest.mark.asyncio
+async def test_viewers_hold_no_database_connection(monkeypatch):
+    manager = ConnectionManager()
+    publisher = LeaderboardPublisher(manager, window="daily")
+
+    async def leaderboard(db):
+        # As the SQL fallback of a board that is not warm yet
+        await db.execute(text("SELECT 1"))
+        return [{"rank": 1, **row("a")}]
+
+    publisher.leaderboard = leaderboard
+    monkeypatch.setattr("app.websockets.leaderboard.publishers", {"daily": publisher})
+    viewers = [ViewerSocket(window="daily") for _ in range(3)]
+    watching = [asyncio.create_task(leaderboard_websocket_endpoint(viewer)) for viewer in viewers]
+    try:
+        async with asyncio.timeout(5):
+            while not all(viewer.sent for viewer in viewers):
+                await asyncio.sleep(0.01)
+        assert engine.pool.checkedout() == 0
+    finally:
+        for viewer in viewers:
+            viewer.leave()
+        await asyncio.gather(*watching)
+        await engine.dispose()
@@ -0,0 +1,132 @@
+import asyncio
+import uuid
+import pytest
+from datetime import datetime
+from fastapi import HTTPException
+from httpx import AsyncClient
+from asgi_lifespan import LifespanManager
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.future import select
+from app.main import app
+from app.database import SessionLocal, engine
+from app.games.writer import SessionWriter, session_writer
+from app.models import GameSession, PlayerStats, User
+
+
+async def create_users(count):
+    async with SessionLocal() as db:
+        users = []
+        for _ in range(count):
+            tag = uuid.uuid4().hex[:10]
+            user = User(username=f"writer_{tag}", email=f"writer_{tag}@example.com", hashed_password="")
+            db.add(user)
+            users.append(user)
+        await db.commit()
+        return [u.id for u in users]
+
+
+@pytest.mark.asyncio
+async def test_writes_are_batched_and_conflicts_fail_alone():
+    user_ids = await create_users(5)
+    writer = SessionWriter(flush_ms=50)
+    writer.start()
+    try:
+        now = datetime.utcnow()
+        # The last start repeats the first user and breaks the batch
+        results = await asyncio.gather(
+            *(writer.start_session(user_id, now) for user_id in user_ids + user_ids[:1]),
+            return_exceptions=True
+        )
+    finally:
+        await writer.stop()
+        await engine.dispose()
+
+    assert sum(isinstance(r, int) for r in results) == 5
+    assert sum(isinstance(r, IntegrityError) for r in results) == 1
+    assert writer.stats["batches"] == 1
+    assert writer.stats["replayed_batches"] == 1
+
+
+@pytest.mark.asyncio
+async def test_failed_commit_on_replay_fails_only_that_write(monkeypatch):
+    class FailingSession:
+        """Commits fail for the whole batch and for user 2 alone."""
+        def __init__(self):
+            self.user_ids = []
+
+        async def __aenter__(self):
+            return self
+
+        async def __aexit__(self, *exc):
+            return False
+
+        async def commit(self):
+            if len(self.user_ids) > 1 or self.user_ids == [2]:
+                raise IntegrityError("INSERT", {}, Exception("duplicate"))
+
+    async def apply(db, batch):
+        db.user_ids = [write.user_id for write in batch]
+        return [write.user_id * 10 for write in batch]
+
+    monkeypatch.setattr("app.games.writer.SessionLocal", FailingSession)
+    writer = SessionWriter(flush_ms=50)
+    monkeypatch.setattr(writer, "_apply", apply)
+    writer.start()
+    try:
+        now = datetime.utcnow()
+        results = await asyncio.gather(*(writer.start_session(user_id, now) for user_id in (1, 2, 3)), return_exceptions=True)
+    finally:
+        await writer.stop()
+
+    assert results[0] == 10 and results[2] == 30
+    assert isinstance(results[1], IntegrityError)
+
+
+@pytest.mark.asyncio
+async def test_full_queue_rejects_and_shutdown_flushes():
+    user_ids = await create_users(3)
+    writer = SessionWriter(flush_ms=60_000, max_pending=2)
+    writer.start()
+    try:
+        now = datetime.utcnow()
+        tasks = [asyncio.create_task(writer.start_session(user_id, now)) for user_id in user_ids]
+        await asyncio.sleep(0)
+        # The slow flush never fires: stop() writes out what is queued
+        await writer.stop()
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        async with SessionLocal() as db:
+            written = (await db.execute(select(GameSession.user_id).where(GameSession.user_id.in_(user_ids)))).scalars().all()
+    finally:
+        await engine.dispose()
+
+    assert isinstance(results[2], HTTPException) and results[2].status_code == 503
+    assert sorted(written) == user_ids[:2]
+    assert writer.stats["rejected"] == 1
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("ack", ["sync", "batched"])
+async def test_games_through_the_writer(monkeypatch, ack):
+    monkeypatch.setattr("app.main.SESSION_WRITE_BEHIND", True)
+    monkeypatch.setattr(session_writer, "ack", ack)
+    async with LifespanManager(app):
+        assert session_writer.running
+        async with AsyncClient(app=app, base_url="http://test") as ac:
+            email = f"writer_{ack}@example.com"
+            await ac.post("/auth/register", json={"username": f"writer_{ack}", "email": email, "password": "test123"})
+            res = await ac.post("/auth/login", json={"email": email, "password": "test123"})
+            headers = {"Authorization": f"Bearer {res.json()['access_token']}"}
+
+            res = await ac.post("/games/start", headers=headers)
+            session_id = res.json()["session_id"]
+            assert (await ac.post("/games/start", headers=headers)).status_code == 400
+            assert (await ac.post(f"/games/{session_id}/stop", headers=headers)).status_code == 200
+            # A batched stop is acked before it is written; the next start shares its batch
+            assert (await ac.post("/games/start", headers=headers)).status_code == 200
+
+    assert not session_writer.running
+    async with SessionLocal() as db:
+        user_id = (await db.execute(select(User.id).where(User.email == email))).scalar_one()
+        stats = await db.get(PlayerStats, user_id)
+    await engine.dispose()
+    assert stats.games_played == 1
@@ -0,0 +1,63 @@
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+JSON = "json"
+MSGPACK = "msgpack"
+
+
+def available_encodings():
+    return (JSON, MSGPACK) if msgpack is not None else (JSON,)
+
+
+def negotiate(requested: str):
+    """Encoding to use for a client that asked for ``requested``."""
+    return requested if requested in available_encodings() else JSON
+
+
+def dumps_json(message: dict) -> str:
+    if orjson is not None:
+        return orjson.dumps(message).decode()
+    return json.dumps(message, separators=(",", ":"))
+
+
+class Frame:
+    """A message encoded at most once per wire format, however many
+    clients it is sent to."""
+
+    __slots__ = ("message", "_text", "_binary")
+
+    def __init__(self, message: dict):
+        self.message = message
+        self._text = None
+        self._binary = None
+
+    @property
+    def type(self):
+        return self.message.get("type")
+
+    @property
+    def text(self) -> str:
+        if self._text is None:
+            self._text = dumps_json(self.message)
+        return self._text
+
+    @property
+    def binary(self) -> bytes:
+        if self._binary is None:
+            self._binary = msgpack.packb(self.message)
+        return self._binary
+
+    async def send(self, websocket, encoding: str = JSON):
+        if encoding == MSGPACK:
+            await websocket.send_bytes(self.binary)
+        else:
+            await websocket.send_text(self.text)
@@ -1,36 +1,339 @@
-import asyncio
-from fastapi import WebSocket, WebSocketDisconnect
-from typing import List
-from app.leaderboard.routes import get_leaderboard 
-from sqlalchemy.ext.asyncio import AsyncSession
-from app.database import get_db
-from app.database import SessionLocal
-
-
-class ConnectionManager:
-    def __init__(self):
-        self.active_connections: List[WebSocket] = []
-
-    async def connect(self, websocket: WebSocket):
-        await websocket.accept()
-        self.active_connections.append(websocket)
-
-    def disconnect(self, websocket: WebSocket):
-        if websocket in self.active_connections:
-            self.active_connections.remove(websocket)
-
-    async def broadcast(self, message: dict):
-        for connection in self.active_connections:
-            await connection.send_json(message)
-
-manager = ConnectionManager()
-
-async def leaderboard_websocket_endpoint(websocket: WebSocket, db: AsyncSession):
-    await manager.connect(websocket)
-    try:
-        while True:
-            leaderboard = await get_leaderboard(db=db, skip=0, limit=10)
-            await manager.broadcast({"leaderboard": leaderboard})
-            await asyncio.sleep(3)
-    except WebSocketDisconnect:
-        manager.disconnect(websocket)
\ No newline at end of file
+import asyncio
+import logging
+import time
+import uuid
+from collections import deque
+from fastapi import WebSocket, WebSocketDisconnect, status
+from typing import Dict
+from app.leaderboard.routes import leaderboard_rows
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import SessionLocal
+from app.websockets.encoding import Frame, JSON, negotiate
+from app.leaderboard.ranking import WINDOWS
+from app.metrics import registry
+
+PUBLISH_INTERVAL_SECONDS = 3
+LEADERBOARD_SIZE = 10
+SEND_QUEUE_SIZE = 4
+MAX_LAGGING_FRAMES = 16
+SEND_TIMEOUT_SECONDS = 10
+DELTA_HISTORY_SIZE = 64
+
+logger = logging.getLogger(__name__)
+
+broadcast_seconds = registry.histogram(
+    "websocket_broadcast_duration_seconds",
+    "Time to build a leaderboard update and queue it for every viewer.", ("window",)
+)
+
+
+class ClientConnection:
+    __slots__ = ("websocket", "encoding", "queue", "ready", "lagging", "writer")
+
+    def __init__(self, websocket: WebSocket, encoding: str = JSON):
+        self.websocket = websocket
+        self.encoding = encoding
+        self.queue = deque()
+        self.ready = asyncio.Event()
+        self.lagging = 0
+        self.writer = None
+
+
+class ConnectionManager:
+    """Fans messages out to every viewer without waiting on any of them.
+
+    Each connection gets a bounded outgoing queue drained by its own writer
+    task. When a queue is full the stale frames are dropped and only the
+    newest one is kept; a client that keeps falling behind, or whose send
+    fails or stalls, is disconnected.
+
+    Messages are wrapped in a Frame, so a broadcast is serialized once per
+    wire format rather than once per client.
+    """
+
+    def __init__(self, queue_size: int = SEND_QUEUE_SIZE, max_lagging: int = MAX_LAGGING_FRAMES, send_timeout: float = SEND_TIMEOUT_SECONDS):
+        self.active_connections: Dict[WebSocket, ClientConnection] = {}
+        self.queue_size = queue_size
+        self.max_lagging = max_lagging
+        self.send_timeout = send_timeout
+        self.stats = {
+            "connected": 0,
+            "disconnected": 0,
+            "messages_sent": 0,
+            "frames_coalesced": 0,
+            "clients_evicted": 0,
+            "send_errors": 0,
+        }
+        self._closing = set()
+        # Returns a full snapshot; set by the publisher so a client whose
+        # deltas were dropped can be brought back in sync
+        self.resync = None
+
+    async def connect(self, websocket: WebSocket, encoding: str = JSON):
+        await websocket.accept()
+        client = ClientConnection(websocket, negotiate(encoding))
+        client.writer = asyncio.create_task(self._write(client))
+        self.active_connections[websocket] = client
+        self.stats["connected"] += 1
+
+    def disconnect(self, websocket: WebSocket):
+        client = self.active_connections.pop(websocket, None)
+        if client is None:
+            return
+        if client.writer is not None and client.writer is not asyncio.current_task():
+            client.writer.cancel()
+        self.stats["disconnected"] += 1
+
+    def send(self, websocket: WebSocket, message):
+        client = self.active_connections.get(websocket)
+        if client is not None:
+            self._enqueue(client, message if isinstance(message, Frame) else Frame(message))
+
+    def broadcast(self, message):
+        frame = message if isinstance(message, Frame) else Frame(message)
+        for client in list(self.active_connections.values()):
+            self._enqueue(client, frame)
+
+    def _enqueue(self, client: ClientConnection, frame: Frame):
+        if len(client.queue) >= self.queue_size:
+            # Latest snapshot wins: anything still queued is already stale
+            self.stats["frames_coalesced"] += len(client.queue)
+            client.lagging += len(client.queue)
+            client.queue.clear()
+            if client.lagging > self.max_lagging:
+                self._evict(client)
+                return
+            if self.resync is not None and frame.type == "delta":
+                frame = self.resync() or frame
+        client.queue.append(frame)
+        client.ready.set()
+
+    def _evict(self, client: ClientConnection):
+        self.stats["clients_evicted"] += 1
+        self.disconnect(client.websocket)
+        task = asyncio.create_task(self._close(client.websocket))
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
+
+    async def _close(self, websocket: WebSocket):
+        try:
+            await asyncio.wait_for(websocket.close(code=status.WS_1013_TRY_AGAIN_LATER), timeout=self.send_timeout)
+        except Exception:
+            pass
+
+    async def _write(self, client: ClientConnection):
+        try:
+            while True:
+                await client.ready.wait()
+                while client.queue:
+                    frame = client.queue.popleft()
+                    await asyncio.wait_for(frame.send(client.websocket, client.encoding), timeout=self.send_timeout)
+                    self.stats["messages_sent"] += 1
+                client.ready.clear()
+                client.lagging = 0
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            self.stats["send_errors"] += 1
+            self.disconnect(client.websocket)
+
+
+def diff_leaderboards(old: list, new: list):
+    """Row-level changes that turn the ``old`` board into the ``new`` one."""
+    before = {row["username"]: row for row in old}
+    after = {row["username"]: row for row in new}
+    changes = [
+        {"op": "exit", "username": row["username"]}
+        for row in old if row["username"] not in after
+    ]
+    for row in new:
+        previous = before.get(row["username"])
+        if previous is None:
+            changes.append({"op": "enter", "row": row})
+        elif previous == row:
+            continue
+        elif {**previous, "rank": row["rank"]} == row:
+            changes.append({"op": "move", "username": row["username"], "rank": row["rank"]})
+        else:
+            changes.append({"op": "update", "row": row})
+    return changes
+
+
+class LeaderboardPublisher:
+    """One background task per process that computes the leaderboard and
+    pushes it to every viewer, either on a fixed tick or as soon as a game
+    finishes.
+
+    Every change bumps ``version``. Viewers get a full snapshot when they
+    connect and row-level deltas afterwards; nothing is sent when the board
+    did not change. Recent deltas are kept so a client reconnecting with the
+    ``epoch`` and ``version`` it last saw only receives what it missed.
+    """
+
+    def __init__(self, manager: ConnectionManager, interval: float = PUBLISH_INTERVAL_SECONDS, size: int = LEADERBOARD_SIZE, history: int = DELTA_HISTORY_SIZE, window: str = "all"):
+        self.manager = manager
+        self.window = window
+        self.interval = interval
+        self.size = size
+        self.epoch = uuid.uuid4().hex[:12]
+        self.version = 0
+        self.rows = None
+        self.latest = None
+        self.latest_frame = None
+        self._history = deque(maxlen=history)
+        self._changed = None
+        self._stopping = False
+        self._task = None
+        manager.resync = lambda: self.latest_frame
+
+    def notify(self):
+        if self._changed is not None:
+            self._changed.set()
+
+    def start(self):
+        if self._task is None:
+            self._changed = asyncio.Event()
+            self._stopping = False
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            # wait_for can swallow the cancel when the event fires at the
+            # same time, e.g. right after a final score; the flag still ends it
+            self._stopping = True
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._changed = None
+        self._history.clear()
+        self.rows = None
+        self.latest = None
+        self.latest_frame = None
+
+    async def leaderboard(self, db: AsyncSession):
+        rows = await leaderboard_rows(db, skip=0, limit=self.size, window=self.window)
+        return [{"rank": rank, **row} for rank, row in enumerate(rows, start=1)]
+
+    async def refresh(self, db: AsyncSession):
+        started = time.perf_counter()
+        rows = await self.leaderboard(db)
+        if rows == self.rows:
+            return False
+
+        previous = self.rows
+        self.version += 1
+        self.rows = rows
+        self.latest = {
+            "type": "snapshot",
+            "epoch": self.epoch,
+            "version": self.version,
+            "leaderboard": rows,
+        }
+        self.latest_frame = Frame(self.latest)
+        if previous is not None:
+            delta = Frame({
+                "type": "delta",
+                "epoch": self.epoch,
+                "version": self.version,
+                "base_version": self.version - 1,
+                "changes": diff_leaderboards(previous, rows),
+            })
+            self._history.append(delta)
+            self.manager.broadcast(delta)
+            broadcast_seconds.observe(time.perf_counter() - started, self.window)
+        return True
+
+    async def publish(self):
+        async with SessionLocal() as db:
+            return await self.refresh(db)
+
+    def resume(self, epoch: str, version: int):
+        """Deltas a client at ``version`` needs, or None if it must resync."""
+        if epoch != self.epoch or version > self.version:
+            return None
+        if version == self.version:
+            return []
+        missed = [delta for delta in self._history if delta.message["version"] > version]
+        if not missed or missed[0].message["base_version"] != version:
+            return None
+        return missed
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._changed.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            if self._stopping:
+                return
+            self._changed.clear()
+            if not self.manager.active_connections:
+                continue
+            try:
+                await self.publish()
+            except Exception:
+                logger.exception("Leaderboard publish failed")
+
+
+# One board, and one set of viewers, per leaderboard window
+publishers = {window: LeaderboardPublisher(ConnectionManager(), window=window) for window in WINDOWS}
+publisher = publishers["all"]
+manager = publisher.manager
+
+
+def _manager_stat(name: str):
+    return {(window,): p.manager.stats[name] for window, p in publishers.items()}
+
+
+registry.gauge(
+    "websocket_connections", "Open leaderboard WebSocket connections.", ("window",),
+    collect=lambda: {(window,): len(p.manager.active_connections) for window, p in publishers.items()}
+)
+registry.counter(
+    "websocket_messages_sent_total", "Frames written to leaderboard viewers.", ("window",),
+    collect=lambda: _manager_stat("messages_sent")
+)
+registry.counter(
+    "websocket_frames_coalesced_total", "Stale queued frames dropped for slow viewers.", ("window",),
+    collect=lambda: _manager_stat("frames_coalesced")
+)
+registry.counter(
+    "websocket_clients_evicted_total", "Viewers disconnected for lagging too long.", ("window",),
+    collect=lambda: _manager_stat("clients_evicted")
+)
+registry.counter(
+    "websocket_send_errors_total", "Failed sends, each dropping its viewer.", ("window",),
+    collect=lambda: _manager_stat("send_errors")
+)
+
+async def leaderboard_websocket_endpoint(websocket: WebSocket):
+    publisher = publishers.get(websocket.query_params.get("window", "all"))
+    if publisher is None:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    manager = publisher.manager
+    # Bring the board up to date before this client is registered: a change
+    # found now is broadcast to the viewers already there, not ahead of this
+    # client's snapshot. From registration to queuing its first frames
+    # nothing awaits, so every later delta builds on what it was sent.
+    # publish() uses its own short session: one held for the life of the
+    # socket would keep a pooled connection checked out.
+    await publisher.publish()
+    await manager.connect(websocket, websocket.query_params.get("encoding", JSON))
+    try:
+        missed = None
+        since = websocket.query_params.get("version")
+        if since is not None and since.isdigit():
+            missed = publisher.resume(websocket.query_params.get("epoch"), int(since))
+        for frame in missed if missed is not None else [publisher.latest_frame]:
+            manager.send(websocket, frame)
+        # Updates are pushed by the publisher; just wait here for the client to leave
+        while True:
+            await websocket.receive_text()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        manager.disconnect(websocket)
@@ -0,0 +1,116 @@
+"""Login throughput and latency of unrelated endpoints during a login storm.
+
+Drives the app in process against a throwaway SQLite database:
+
+    python -m benchmarks.login_storm --logins 200 --concurrency 50 --workers 4
+    python -m benchmarks.login_storm --workers 0   # bcrypt inline on the event loop, for comparison
+
+Prints a JSON report.
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import tempfile
+import time
+
+
+def percentile(samples, pct):
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+async def run(args):
+    from httpx import ASGITransport, AsyncClient
+    from asgi_lifespan import LifespanManager
+    from app.main import app
+    from app.database import engine, pool_stats
+    from app.auth.utils import PasswordHasher
+    import app.auth.routes as auth_routes
+
+    hasher = PasswordHasher(workers=args.workers, max_pending=args.logins + args.users)
+    auth_routes.password_hasher = hasher
+
+    async with LifespanManager(app):
+        transport = ASGITransport(app=app)
+        async with AsyncClient(transport=transport, base_url="http://bench") as client:
+            for i in range(args.users):
+                await client.post("/auth/register", json={
+                    "username": f"storm{i}", "email": f"storm{i}@example.com", "password": "storm-password"
+                })
+
+            probe_latencies = []
+            storm_done = asyncio.Event()
+
+            async def probe():
+                while not storm_done.is_set():
+                    started = time.perf_counter()
+                    await client.get("/leaderboard/")
+                    probe_latencies.append((time.perf_counter() - started) * 1000)
+                    await asyncio.sleep(args.probe_interval)
+
+            semaphore = asyncio.Semaphore(args.concurrency)
+            login_latencies = []
+
+            async def login(i):
+                async with semaphore:
+                    started = time.perf_counter()
+                    res = await client.post("/auth/login", json={
+                        "email": f"storm{i % args.users}@example.com", "password": "storm-password"
+                    })
+                    res.raise_for_status()
+                    login_latencies.append((time.perf_counter() - started) * 1000)
+
+            probe_task = asyncio.create_task(probe())
+            started = time.perf_counter()
+            await asyncio.gather(*(login(i) for i in range(args.logins)))
+            elapsed = time.perf_counter() - started
+            storm_done.set()
+            await probe_task
+
+    hasher.shutdown()
+    await engine.dispose()
+    return {
+        "workers": args.workers,
+        "executor": hasher.executor,
+        "logins": args.logins,
+        "concurrency": args.concurrency,
+        "logins_per_second": round(args.logins / elapsed, 2),
+        "login_ms": {
+            "p50": percentile(login_latencies, 50),
+            "p99": percentile(login_latencies, 99),
+        },
+        "probe_ms": {
+            "samples": len(probe_latencies),
+            "p50": percentile(probe_latencies, 50),
+            "p99": percentile(probe_latencies, 99),
+            "mean": statistics.fmean(probe_latencies) if probe_latencies else None,
+        },
+        "max_pending_seen": hasher.max_pending_seen,
+        "db_pool": pool_stats.snapshot(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--workers", type=int, default=4, help="bcrypt pool size, 0 to hash inline")
+    parser.add_argument("--probe-interval", type=float, default=0.01)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{tmp}/bench.db"
+        os.environ.setdefault("SECRET_KEY", "benchmark-secret")
+        os.environ.setdefault("ALGORITHM", "HS256")
+        os.environ["MIGRATE_ON_STARTUP"] = "true"
+        print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""Game start/stop throughput with direct writes and with the write-behind queue.
+
+Drives the app in process against a throwaway SQLite database, with a
+fresh set of players per mode:
+
+    python -m benchmarks.session_writes --players 500 --rounds 4
+    python -m benchmarks.session_writes --modes direct,sync,batched --flush-ms 5
+
+Prints a JSON report.
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+
+
+def percentile(samples, pct):
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+async def run(args, mode):
+    from httpx import ASGITransport, AsyncClient
+    from asgi_lifespan import LifespanManager
+    from app.main import app
+    from app.database import engine, pool_stats, SessionLocal
+    from app.models import User
+    from app.auth.utils import create_access_token
+    from app.games.writer import session_writer
+    import app.main as main
+
+    main.SESSION_WRITE_BEHIND = mode != "direct"
+    session_writer.ack = "batched" if mode == "batched" else "sync"
+    session_writer.flush_ms = args.flush_ms
+    session_writer.batch_size = args.batch_size
+    for key in session_writer.stats:
+        session_writer.stats[key] = 0
+    pool_stats.reset()
+
+    async with LifespanManager(app):
+        transport = ASGITransport(app=app)
+        async with AsyncClient(transport=transport, base_url="http://bench") as client:
+            # Players are inserted directly, bcrypt is not what is measured here
+            async with SessionLocal() as db:
+                users = [
+                    User(username=f"{mode}{i}", email=f"{mode}{i}@example.com", hashed_password="")
+                    for i in range(args.players)
+                ]
+                db.add_all(users)
+                await db.commit()
+            headers = [
+                {"Authorization": f"Bearer {create_access_token({'sub': str(u.id), 'username': u.username})}"}
+                for u in users
+            ]
+
+            latencies = []
+            semaphore = asyncio.Semaphore(args.concurrency)
+
+            async def call(path, h):
+                async with semaphore:
+                    started = time.perf_counter()
+                    res = await client.post(path, headers=h)
+                    res.raise_for_status()
+                    latencies.append((time.perf_counter() - started) * 1000)
+                    return res.json()
+
+            async def play(h):
+                for _ in range(args.rounds):
+                    session = await call("/games/start", h)
+                    await call(f"/games/{session['session_id']}/stop", h)
+
+            started = time.perf_counter()
+            await asyncio.gather(*(play(h) for h in headers))
+            elapsed = time.perf_counter() - started
+
+    await engine.dispose()
+    requests = args.players * args.rounds * 2
+    return {
+        "mode": mode,
+        "requests": requests,
+        "requests_per_second": round(requests / elapsed, 2),
+        "latency_ms": {
+            "p50": percentile(latencies, 50),
+            "p99": percentile(latencies, 99),
+        },
+        "writer": dict(session_writer.stats) if mode != "direct" else None,
+        "db_pool": pool_stats.snapshot(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--players", type=int, default=500)
+    parser.add_argument("--rounds", type=int, default=4)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--modes", default="direct,sync,batched")
+    parser.add_argument("--flush-ms", type=float, default=5)
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{tmp}/bench.db"
+        os.environ.setdefault("SECRET_KEY", "benchmark-secret")
+        os.environ.setdefault("ALGORITHM", "HS256")
+        os.environ["MIGRATE_ON_STARTUP"] = "true"
+        os.environ["SWEEP_ENABLED"] = "false"
+        reports = [asyncio.run(run(args, mode)) for mode in args.modes.split(",")]
+        print(json.dumps(reports, indent=2))
+
+
+if __name__ == "__main__":
+    main()